@@ -17,8 +17,31 @@ class Settings(BaseSettings):
     PORT: int = 8000
     DEBUG: bool = True
     
+    # Embeddings: "sentence-transformers" (reference) or "onnx-int8"
+    EMBEDDING_BACKEND: str = "sentence-transformers"
+    EMBEDDING_ONNX_PATH: str = "data/onnx/all-MiniLM-L6-v2-int8"
+    # Query micro-batching: flush after this many queries or this many ms
+    EMBEDDING_MAX_BATCH: int = 32
+    EMBEDDING_MAX_WAIT_MS: float = 5.0
+    # Cross-encoder reranking of retrieved chunks, skipped when over budget
+    SEARCH_RERANK: bool = False
+    RERANKER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_BUDGET_MS: float = 40.0
+    # Adaptive k: drop hits beyond this distance, or this far (relative) behind the best hit
+    SEARCH_MAX_DISTANCE: Optional[float] = None
+    SEARCH_MAX_DISTANCE_GAP: Optional[float] = None
+    # Fetch only ids/distances from the ANN query and fill text from an in-process chunk cache,
+    # warmed at startup with the most-retrieved chunks
+    SEARCH_IDS_ONLY: bool = False
+    CHUNK_CACHE_SIZE: int = 20000
+    CHUNK_CACHE_WARM: int = 2000
+    # Small-to-big: return each hit with this many neighboring chunks either side (0 = off)
+    SEARCH_NEIGHBORS: int = 0
+    
     # Redis
     REDIS_URL: Optional[str] = "redis://localhost:6379"
+    # Retrieval result cache: "memory" (per worker) or "redis" (shared via REDIS_URL)
+    RETRIEVAL_CACHE_BACKEND: str = "memory"
     
     class Config:
         env_file = ".env"
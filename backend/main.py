@@ -2,6 +2,7 @@ from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -10,6 +11,13 @@ from core.config import settings
 from core.database import engine, Base
 from models.user import User
 from models.chat import ChatSession, ChatMessage
+from utils import embedding
+from utils.async_vector_db import close_pool
+from utils.chunk_cache import chunk_cache, configure_chunk_cache
+from utils.embedding_queue import configure_batcher
+from utils.reranker import configure_reranker, get_reranker
+from utils.retrieval_cache import configure_retrieval_cache
+from utils.vector_db import create_tables
 
 load_dotenv()
 
@@ -17,9 +25,34 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     # Startup
     Base.metadata.create_all(bind=engine)
+    if settings.EMBEDDING_BACKEND == "onnx-int8":
+        embedding.configure(settings.EMBEDDING_BACKEND, model_dir=settings.EMBEDDING_ONNX_PATH)
+    else:
+        embedding.configure(settings.EMBEDDING_BACKEND)
+    # legal_chunks is the retrieval index uploads are mirrored into; a no-op
+    # (catalog reads only) once the schema is up to date. It also switches to
+    # the embedding model the last reindex recorded, if that differs.
+    create_tables()
+    # Load the embedding model before serving so the first chat is not slow
+    embedding.warm_up()
+    batcher = configure_batcher(settings.EMBEDDING_MAX_BATCH, settings.EMBEDDING_MAX_WAIT_MS)
+    if settings.RETRIEVAL_CACHE_BACKEND == "redis" and settings.REDIS_URL:
+        configure_retrieval_cache(settings.REDIS_URL)
+    configure_reranker(
+        settings.SEARCH_RERANK, model_name=settings.RERANKER_MODEL, budget_ms=settings.RERANK_BUDGET_MS
+    )
+    if settings.SEARCH_RERANK:
+        get_reranker().warm_up()
+    configure_chunk_cache(settings.SEARCH_IDS_ONLY, settings.CHUNK_CACHE_SIZE)
+    if settings.SEARCH_IDS_ONLY:
+        await asyncio.to_thread(chunk_cache.warm, settings.CHUNK_CACHE_WARM)
     yield
     # Shutdown
-    pass
+    await batcher.close()
+    if settings.SEARCH_IDS_ONLY:
+        # Keep this worker's retrieval counts for the next warm-up
+        await asyncio.to_thread(chunk_cache.flush_traffic)
+    await close_pool()
 
 app = FastAPI(
     title="JuristAI API",
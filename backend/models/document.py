@@ -1,6 +1,7 @@
 from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID, VECTOR
+from sqlalchemy.dialects.postgresql import UUID
+from pgvector.sqlalchemy import Vector
 from datetime import datetime
 import uuid
 
@@ -29,7 +30,7 @@ class DocumentChunk(Base):
     document_id = Column(UUID(as_uuid=True), ForeignKey("legal_documents.id"), nullable=False)
     content = Column(Text, nullable=False)
     chunk_number = Column(Integer, nullable=False)
-    embedding = Column(VECTOR(1536), nullable=False)  # Using OpenAI embedding dimensions
+    embedding = Column(Vector(384), nullable=False)  # all-MiniLM-L6-v2, same as legal_chunks
     references = Column(Text)  # JSON string of legal references
     country = Column(String(50), nullable=False, default="nigeria")
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -7,10 +7,12 @@ import uuid
 import json
 import re
 
+from core.config import settings
 from core.database import get_db
 from models.chat import ChatSession, ChatMessage
 from models.user import User
-from utils.vector_db import search_similar_chunks
+from utils.async_vector_db import search_similar_chunks_async
+from utils.reranker import rerank_enabled
 
 class ChatService:
     def __init__(self, db):
@@ -27,10 +29,32 @@ class ChatService:
         # Get conversation history for context
         history = await self._get_conversation_history(user_id)
 
-        # Retrieve top-k relevant chunks from pgvector
+        # Retrieve top-k relevant chunks from pgvector without blocking the
+        # event loop: the query embedding is batched with concurrent requests
+        # and the DB query is awaited on asyncpg.
         try:
-            retrieved = search_similar_chunks(content, k=5)
-        except Exception:
+            # Hybrid (full-text + vector) ranking keeps named sections in the
+            # top results, and MMR drops near-duplicate overlapping chunks,
+            # so fewer chunks are needed in the prompt; with the cross-encoder
+            # reranker on, 3 are enough
+            k = 3 if rerank_enabled() else 4
+            # Distance cutoffs drop weak hits from the vector fallback (hybrid
+            # rows are in fused order, so they skip them); small-to-big expansion brings provisions that span chunk boundaries in whole
+            search_kwargs = dict(
+                k=k, country=country, diversify=True,
+                max_distance=settings.SEARCH_MAX_DISTANCE, max_gap=settings.SEARCH_MAX_DISTANCE_GAP, min_k=1,
+                neighbors=settings.SEARCH_NEIGHBORS,
+                # The shared corpus plus this user's own uploads, never anyone else's
+                owner_user_id=user_id,
+            )
+            try:
+                retrieved = await search_similar_chunks_async(content, mode="hybrid", **search_kwargs)
+            except Exception as e:
+                # e.g. no full-text column yet: vector search still grounds the answer
+                print(f"⚠️ Hybrid retrieval failed, falling back to vector search: {e}")
+                retrieved = await search_similar_chunks_async(content, mode="vector", **search_kwargs)
+        except Exception as e:
+            print(f"❌ Retrieval failed, answering without corpus context: {e}")
             retrieved = []
 
         # If user asks for decided cases and none exist in corpus, answer without hallucination
@@ -85,8 +109,10 @@ class ChatService:
         # Build retrieved context as citations
         retrieved_context = ""
         if retrieved:
+            # Expanded passages span 2 * SEARCH_NEIGHBORS + 1 chunks
+            limit = 600 * (2 * settings.SEARCH_NEIGHBORS + 1)
             retrieved_context = "\n\nCorpus context (cite ONLY from these; do NOT invent citations):\n" + "\n".join(
-                [f"- [{os.path.basename(str(r[2]))}] {str(r[1])[:600]}" for r in retrieved]
+                [f"- [{os.path.basename(str(r[2]))}] {str(r[1])[:limit]}" for r in retrieved]
             )
 
         rules = (
@@ -158,7 +184,7 @@ Answer format: (1) Direct rule in one sentence. (2) Focused legal basis with cor
         cases = []
         seen = set()
         for row in retrieved:
-            # row: (id, text, source)
+            # row: (id, text, source, distance)
             text = str(row[1])
             source = os.path.basename(str(row[2]))
             # Try to extract a section reference
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import fitz  # PyMuPDF
 import pytesseract
@@ -9,8 +10,10 @@ from datetime import datetime
 import uuid
 import hashlib
 
-from utils.embedding import get_embedding
-from utils.vector_db import add_chunk_to_db
+from utils.embedding import get_embeddings
+from utils.chunk_writer import copy_document_chunks
+from utils.retrieval_cache import bump_corpus_version
+from utils.vector_db import delete_document_chunks, upsert_document_chunks
 from models.document import LegalDocument, DocumentChunk
 from core.database import get_db
 
@@ -48,8 +51,10 @@ class DocumentService:
             # Process chunks and add to vector database
             processed_chunks = await self._process_chunks(chunks, country)
             
-            # Save chunks to database
-            await self._save_chunks_to_db(processed_chunks, document.id)
+            # Save chunks to database and the shared retrieval index; commits
+            # the document, its chunks and their index entries together
+            await self._save_chunks_to_db(processed_chunks, document.id, filename, document_type, user_id)
+            self._invalidate_retrieval_cache(document.id)
             
             return {
                 "success": True,
@@ -61,6 +66,7 @@ class DocumentService:
             }
             
         except Exception as e:
+            self.db.rollback()
             return {
                 "success": False,
                 "error": str(e)
@@ -131,8 +137,9 @@ class DocumentService:
             status="processed"
         )
         
+        # Flush only: the record is committed along with its chunks
         self.db.add(document)
-        self.db.commit()
+        self.db.flush()
         
         return document
 
@@ -220,10 +227,13 @@ class DocumentService:
         """Process chunks and generate embeddings"""
         processed_chunks = []
         
-        for chunk in chunks:
+        # Generate embeddings for all chunks in batched forward passes, in a
+        # worker thread so the event loop keeps serving other requests
+        embeddings = await asyncio.to_thread(get_embeddings, [chunk["content"] for chunk in chunks])
+        
+        for chunk, embedding in zip(chunks, embeddings):
             try:
-                # Generate embedding for chunk
-                embedding = await get_embedding(chunk["content"])
+                embedding = embedding.tolist()
                 
                 # Extract legal references from chunk
                 references = await self._extract_legal_references(chunk["content"])
@@ -298,24 +308,34 @@ class DocumentService:
         
         return references
 
-    async def _save_chunks_to_db(self, chunks: List[Dict], document_id: str):
-        """Save processed chunks to database"""
-        for chunk_data in chunks:
-            chunk = DocumentChunk(
-                id=chunk_data["id"],
-                document_id=document_id,
-                content=chunk_data["content"],
-                chunk_number=chunk_data["chunk_number"],
-                embedding=chunk_data["embedding"],
-                references=str(chunk_data["references"]),
-                country=chunk_data["country"],
-                created_at=chunk_data["created_at"]
-            )
-            
-            self.db.add(chunk)
+    async def _save_chunks_to_db(
+        self, 
+        chunks: List[Dict], 
+        document_id: str, 
+        filename: str, 
+        document_type: str,
+        user_id: str
+    ):
+        """Save processed chunks to database with binary COPY in the session's transaction"""
+        dbapi_conn = self.db.connection().connection.dbapi_connection
+        copy_document_chunks(
+            dbapi_conn,
+            [{**chunk_data, "document_id": document_id} for chunk_data in chunks]
+        )
+        
+        # Mirror the chunks into legal_chunks so the uploader's chat retrieval searches them
+        upsert_document_chunks(dbapi_conn, document_id, filename, user_id, document_type)
         
         self.db.commit()
 
+    def _invalidate_retrieval_cache(self, document_id: str):
+        """Bump the corpus version so cached search results and this document's cached chunks are refreshed"""
+        try:
+            bump_corpus_version([document_id])
+        except Exception as e:
+            # The chunks are already committed; entries age out via the cache TTL
+            print(f"Error bumping corpus version: {e}")
+
     async def get_documents_by_country(self, country: str) -> List[Dict]:
         """Get all documents for a specific country"""
         documents = self.db.query(LegalDocument).filter(
@@ -336,6 +356,9 @@ class DocumentService:
     async def delete_document(self, document_id: str) -> bool:
         """Delete document and all its chunks"""
         try:
+            # Drop the document's entries from the retrieval index
+            delete_document_chunks(self.db.connection().connection.dbapi_connection, document_id)
+            
             # Delete chunks first
             self.db.query(DocumentChunk).filter(
                 DocumentChunk.document_id == document_id
@@ -347,6 +370,7 @@ class DocumentService:
             ).delete()
             
             self.db.commit()
+            self._invalidate_retrieval_cache(document_id)
             return True
             
         except Exception as e:
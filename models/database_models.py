@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, Index, Computed
 from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 from sqlalchemy.sql import func
 from datetime import datetime
 from config.database import Base
@@ -82,7 +83,24 @@ class LegalChunk(Base):
     id = Column(Integer, primary_key=True, index=True)
     text = Column(Text, nullable=False)
     source = Column(String, nullable=True)
-    embedding = Column(Vector(1536))  # Adjust this if using another dimension
+    embedding = Column(Vector(384))  # all-MiniLM-L6-v2
+    # server_default, so raw inserts and COPY (utils.vector_db) get the same defaults
+    country = Column(String(50), nullable=False, server_default="nigeria")
+    document_type = Column(String(100), nullable=False, server_default="legal_document")
+    # "corpus" for ingested statutes, "upload" for chunks mirrored from document_chunks
+    source_type = Column(String(20), nullable=False, server_default="corpus")
+    document_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    chunk_key = Column(String(255), unique=True, nullable=True)
+    # Position within its document (source / document_id), from 1; NULL for single inserts
+    chunk_number = Column(Integer, nullable=True)
+    # Uploader of a private upload; NULL for the shared corpus
+    owner_user_id = Column(String(255), nullable=True)
+    # Full-text column for hybrid search (utils.vector_db, mode="hybrid")
+    tsv = Column(TSVECTOR, Computed("to_tsvector('english', text)", persisted=True))
+    __table_args__ = (
+        Index("legal_chunks_source_chunk_number_idx", "source", "chunk_number"),
+        Index("legal_chunks_tsv_idx", "tsv", postgresql_using="gin"),
+    )
 
 
 class ChatSession(Base):
@@ -9,6 +9,7 @@ from utils.db_utils import log_query, log_feedback, get_or_create_chat_session,
 from utils.auth import get_current_firebase_user, login_required
 from config.database import SessionLocal
 from utils.vector_db import search_similar_chunks as search_chunks
+from utils.reranker import rerank_enabled
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -99,9 +100,13 @@ def format_legal_citations(text):
     
     return text
 
-def get_context_from_db(user_query, k=4):
+def get_context_from_db(user_query, k=None):
     """Get relevant context from database with enhanced search"""
-    results = search_chunks(user_query, k=k)
+    # Cross-encoder reranking is precise enough to keep the prompt to 3 chunks
+    if k is None:
+        k = 3 if rerank_enabled() else 4
+    # MMR keeps overlapping chunks of the same passage out of the prompt
+    results = search_chunks(user_query, k=k, diversify=True)
     
     if not results:
         return "No specific legal references found in the database for this query."
@@ -269,7 +274,7 @@ def chat_interface():
         with st.spinner("Consulting Nigerian law..."):
             try:
                 # Get context with enhanced search
-                context = get_context_from_db(user_input, k=4)
+                context = get_context_from_db(user_input)
 
                 # Create smarter history summary
                 history_summary = summarize_history(st.session_state.chat_history)
@@ -0,0 +1,238 @@
+# utils/async_vector_db.py
+# asyncpg twin of the read path in utils.vector_db, for the FastAPI backend.
+# The SQL is shared (STATEMENTS already uses asyncpg-style $n parameters);
+# asyncpg prepares each statement once per connection and caches it.
+
+import asyncio
+import os
+from urllib.parse import parse_qs, urlsplit
+
+from utils.chunk_cache import chunk_cache, ids_only_enabled, merge_rows
+from utils.embedding_queue import embed_query
+from utils.passages import merge_passages
+from utils.reranker import rerank_enabled
+from utils.vector_db import (
+    DEFAULT_RECALL,
+    MAX_DISTANCE,
+    MAX_DISTANCE_GAP,
+    MMR_LAMBDA,
+    NEIGHBORS,
+    RRF_K,
+    STATEMENTS,
+    VECTOR_BACKEND,
+    candidate_pool_size,
+    note_pgvector_version,
+    retrieval_cache,
+    retrieval_key,
+    search_settings,
+    search_similar_chunks,
+    search_steps,
+    select_results,
+    statement_name,
+    to_vector,
+)
+
+POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX", "10"))
+# asyncpg sslmode ("disable", "prefer", "require", "verify-full", ...); overrides DATABASE_URL's sslmode
+SSL_MODE = os.getenv("ASYNC_DB_SSL")
+
+_pool = None
+_pool_lock = None
+
+
+def _dsn() -> str:
+    url = os.getenv("DATABASE_URL")
+    if url is None:
+        raise ValueError("❌ DATABASE_URL is not set. Please check your .env file.")
+    # asyncpg takes a plain libpq URL, without SQLAlchemy's driver suffix
+    url = url.replace("postgres://", "postgresql://", 1)
+    return url.replace("postgresql+psycopg2://", "postgresql://", 1)
+
+
+def _ssl_mode(dsn: str) -> str:
+    """ASYNC_DB_SSL, else the URL's sslmode, else "require" like the SQLAlchemy engine (Supabase needs SSL)."""
+    if SSL_MODE:
+        return SSL_MODE
+    return parse_qs(urlsplit(dsn).query).get("sslmode", ["require"])[-1]
+
+
+async def _init_connection(conn):
+    from pgvector.asyncpg import register_vector
+    await register_vector(conn)
+
+
+async def get_pool():
+    """Create the shared asyncpg pool on first use (inside the running loop)."""
+    global _pool, _pool_lock
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                import asyncpg
+                dsn = _dsn()
+                _pool = await asyncpg.create_pool(
+                    dsn,
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    init=_init_connection,
+                    ssl=_ssl_mode(dsn),
+                )
+                # Lets search_settings decide on hnsw.iterative_scan without a blocking sync query
+                note_pgvector_version(
+                    await _pool.fetchval("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                )
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def execute_statement(name, params, settings=None):
+    """Run a named statement from STATEMENTS and return its rows as tuples.
+
+    ``settings`` are applied transaction-locally, like SET LOCAL in the
+    synchronous path.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            for setting, value in (settings or {}).items():
+                await conn.execute("SELECT set_config($1, $2, true)", setting, str(value))
+            rows = await conn.fetch(STATEMENTS[name][1], *params)
+    return [tuple(row) for row in rows]
+
+
+async def query_similar_chunks_async(embedding, k=5, recall=DEFAULT_RECALL, country=None, document_type=None,
+                                     source=None, with_embeddings=False, ids_only=False, owner_user_id=None):
+    filters = (country, document_type, source)
+    statement = statement_name("legal_chunks_search", ids_only, with_embeddings)
+    return await execute_statement(
+        statement, (to_vector(embedding), k, *filters, owner_user_id), settings=search_settings(recall, filters, k)
+    )
+
+
+async def query_hybrid_chunks_async(query, embedding, k=5, recall=DEFAULT_RECALL, candidates=None,
+                                    country=None, document_type=None, source=None, with_embeddings=False,
+                                    ids_only=False, owner_user_id=None):
+    filters = (country, document_type, source)
+    candidates = candidates or max(4 * k, 20)
+    statement = statement_name("legal_chunks_hybrid", ids_only, with_embeddings)
+    return await execute_statement(
+        statement,
+        (to_vector(embedding), k, *filters, str(query), candidates, RRF_K, owner_user_id),
+        settings=search_settings(recall, filters, candidates),
+    )
+
+
+async def hydrate_rows_async(rows):
+    """Async vector_db.hydrate_rows."""
+    # The lookup may re-read the corpus version
+    found, missing = await asyncio.to_thread(chunk_cache.get_many, [row[0] for row in rows])
+    if missing:
+        fetched = await execute_statement("legal_chunks_fetch", ([int(i) for i in missing],))
+        chunk_cache.put_many(fetched)
+        found.update((chunk_id, (text, source)) for chunk_id, text, source in fetched)
+    return merge_rows(rows, found)
+
+
+async def record_traffic_async(results):
+    if chunk_cache.record([row[0] for row in results]):
+        await asyncio.to_thread(chunk_cache.flush_traffic)
+
+
+async def expand_passages_async(rows, neighbors=1, owner_user_id=None):
+    """Async vector_db.expand_passages."""
+    rows = list(rows)
+    if not rows or neighbors <= 0:
+        return rows
+    windows = await execute_statement(
+        "legal_chunks_neighbors", ([int(row[0]) for row in rows], neighbors, owner_user_id)
+    )
+    return merge_passages(rows, windows)
+
+
+async def select_results_async(query, embedding, candidates, k, diversify, mmr_lambda, rerank, *cutoffs):
+    """Async vector_db.select_results."""
+    args = (query, embedding, candidates, k, diversify, mmr_lambda, rerank, *cutoffs)
+    # The cross-encoder is CPU-bound; MMR and cutoffs alone are cheap enough inline
+    return await asyncio.to_thread(select_results, *args) if rerank else select_results(*args)
+
+
+async def run_search_steps_async(steps):
+    """Drive vector_db.search_steps with the awaitable helpers of this module."""
+    handlers = {
+        "hydrate": hydrate_rows_async,
+        "select": select_results_async,
+        "record": record_traffic_async,
+        "expand": expand_passages_async,
+    }
+    result = None
+    while True:
+        try:
+            step, args = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result = await handlers[step](*args)
+
+
+async def search_similar_chunks_async(query, k=5, embedding=None, recall=DEFAULT_RECALL, mode="vector",
+                                      country=None, document_type=None, source=None, use_cache=True,
+                                      diversify=False, fetch_k=None, mmr_lambda=MMR_LAMBDA, rerank=None,
+                                      max_distance=MAX_DISTANCE, max_gap=MAX_DISTANCE_GAP, min_k=1, ids_only=None,
+                                      neighbors=NEIGHBORS, owner_user_id=None):
+    """Async search_similar_chunks: same arguments, same (id, text, source, distance) rows.
+
+    The query is embedded through the micro-batching queue and the DB query
+    is awaited on asyncpg, so the event loop is never blocked. CPU-bound or
+    blocking steps (cache lookups, reranking) run in a worker thread.
+    """
+    if VECTOR_BACKEND == "faiss":
+        # The local store is in-process; just keep it off the event loop
+        return await asyncio.to_thread(
+            search_similar_chunks, query, k=k, embedding=embedding, recall=recall, mode=mode, country=country,
+            document_type=document_type, source=source, use_cache=use_cache, diversify=diversify,
+            fetch_k=fetch_k, mmr_lambda=mmr_lambda, rerank=rerank, max_distance=max_distance, max_gap=max_gap,
+            min_k=min_k, ids_only=ids_only, neighbors=neighbors, owner_user_id=owner_user_id,
+        )
+    if mode not in ("vector", "hybrid"):
+        raise ValueError(f"Unknown search mode '{mode}'. Choose 'vector' or 'hybrid'.")
+    rerank = rerank_enabled() if rerank is None else rerank
+    ids_only = ids_only_enabled() if ids_only is None else ids_only
+    filters = dict(country=country, document_type=document_type, source=source, owner_user_id=owner_user_id)
+    key = None
+    if use_cache:
+        # Key building may re-read the corpus version, and the store may be Redis
+        key = await asyncio.to_thread(
+            retrieval_key,
+            query, k, recall, mode, filters, diversify, fetch_k, mmr_lambda, rerank, max_distance, max_gap, min_k,
+            neighbors,
+        )
+        cached = await asyncio.to_thread(retrieval_cache.get, key)
+        if cached is not None:
+            if ids_only:
+                await record_traffic_async(cached)
+            return cached
+
+    if embedding is None:
+        embedding = await embed_query(query)
+    pool_k = candidate_pool_size(k, diversify, fetch_k, rerank)
+    if mode == "hybrid":
+        results = await query_hybrid_chunks_async(query, embedding, k=pool_k, recall=recall,
+                                                  with_embeddings=diversify, ids_only=ids_only, **filters)
+    else:
+        results = await query_similar_chunks_async(embedding, k=pool_k, recall=recall,
+                                                   with_embeddings=diversify, ids_only=ids_only, **filters)
+    results = await run_search_steps_async(search_steps(
+        query, embedding, results, k, diversify, mmr_lambda, rerank, max_distance, max_gap, min_k, mode, ids_only,
+        neighbors, owner_user_id,
+    ))
+
+    if key is not None:
+        await asyncio.to_thread(retrieval_cache.set, key, results)
+    return results
@@ -0,0 +1,206 @@
+# utils/chunk_cache.py
+
+import os
+import threading
+from collections import Counter, OrderedDict
+
+from utils.retrieval_cache import read_corpus_changes, retrieval_cache
+
+CHUNK_CACHE_SIZE = int(os.getenv("CHUNK_CACHE_SIZE", "20000"))
+# Fetch only (id, distance) from the ANN query and fill text from the cache
+SEARCH_IDS_ONLY = os.getenv("SEARCH_IDS_ONLY", "").lower() in ("1", "true", "yes")
+# How many of the most-retrieved chunks are loaded at startup
+CHUNK_CACHE_WARM = int(os.getenv("CHUNK_CACHE_WARM", "2000"))
+# Retrieval counts are written to chunk_retrievals every this many searches,
+# and halve in weight every this many days so the warm set follows traffic
+TRAFFIC_FLUSH_EVERY = int(os.getenv("CHUNK_TRAFFIC_FLUSH_EVERY", "200"))
+TRAFFIC_HALF_LIFE_DAYS = float(os.getenv("CHUNK_TRAFFIC_HALF_LIFE_DAYS", "7"))
+FETCH_BATCH_SIZE = 1000
+
+# Decayed retrieval count as of now()
+_DECAYED_HITS = (
+    "chunk_retrievals.hits * power(0.5, extract(epoch FROM now() - chunk_retrievals.last_retrieved)"
+    f" / {TRAFFIC_HALF_LIFE_DAYS * 86400})"
+)
+
+
+class ChunkCache:
+    """Per-process LRU of chunk id -> (text, source).
+
+    Searches can then pull only ids and distances over the wire. A chunk's
+    text can change under the same id (a re-processed upload is updated in
+    place), so when the corpus version moves the cache drops the chunks of
+    the documents that bump recorded (see bump_corpus_version), or
+    everything when it cannot tell.
+
+    Also counts how often each id is returned, so a restarted worker can
+    warm up with the chunks that recent traffic asked for most.
+    """
+
+    def __init__(self, max_entries: int = CHUNK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._traffic = Counter()
+        self._searches = 0
+        self._lock = threading.Lock()
+
+    def _sync_version(self, version):
+        # None means the version could not be read
+        with self._lock:
+            previous = self._version
+        if version is None or version == previous:
+            return
+        # Read outside the lock so lookups in other threads are not held up
+        stale = read_corpus_changes(previous, version) if previous is not None else None
+        with self._lock:
+            if self._version != previous:
+                # Another thread synced in the meantime
+                return
+            if stale is None:
+                self._entries.clear()
+            else:
+                for chunk_id in stale:
+                    self._entries.pop(chunk_id, None)
+            self._version = version
+
+    def get_many(self, ids):
+        """Split ``ids`` into ({id: (text, source)} found in the cache, [missing ids])."""
+        version = retrieval_cache.corpus_version()
+        self._sync_version(version)
+        found, missing = {}, []
+        with self._lock:
+            for chunk_id in ids:
+                value = self._entries.get(chunk_id)
+                if value is None:
+                    missing.append(chunk_id)
+                else:
+                    self._entries.move_to_end(chunk_id)
+                    found[chunk_id] = value
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, rows):
+        """Store (id, text, source) rows."""
+        with self._lock:
+            for chunk_id, text, source in rows:
+                self._entries[chunk_id] = (text, source)
+                self._entries.move_to_end(chunk_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def record(self, ids) -> bool:
+        """Count one search's result ids; True once a traffic flush is due."""
+        with self._lock:
+            self._traffic.update(ids)
+            self._searches += 1
+            return self._searches >= TRAFFIC_FLUSH_EVERY
+
+    def flush_traffic(self):
+        """Add the counts recorded since the last flush to chunk_retrievals."""
+        with self._lock:
+            traffic, self._traffic = self._traffic, Counter()
+            self._searches = 0
+        if not traffic:
+            return
+        from utils.vector_db import get_connection
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS chunk_retrievals (
+                            chunk_id INTEGER PRIMARY KEY,
+                            hits DOUBLE PRECISION NOT NULL,
+                            last_retrieved TIMESTAMPTZ NOT NULL
+                        )
+                    """)
+                    cur.execute(f"""
+                        INSERT INTO chunk_retrievals (chunk_id, hits, last_retrieved)
+                        SELECT chunk_id, hits, now() FROM unnest(%s::integer[], %s::double precision[])
+                            AS t(chunk_id, hits)
+                        ON CONFLICT (chunk_id) DO UPDATE SET
+                            hits = {_DECAYED_HITS} + EXCLUDED.hits,
+                            last_retrieved = now()
+                    """, (list(traffic), list(traffic.values())))
+                conn.commit()
+        except Exception as e:
+            # Only warm-up quality depends on it; never fail a search over it
+            print(f"Chunk traffic flush failed: {e}")
+
+    def warm(self, limit: int = CHUNK_CACHE_WARM) -> int:
+        """Load the ``limit`` most-retrieved chunks (by decayed count). Returns how many were cached."""
+        from utils.vector_db import fetch_chunks, get_connection
+        limit = min(limit, self.max_entries)
+        if limit <= 0:
+            return 0
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass('chunk_retrievals') IS NOT NULL")
+                    if not cur.fetchone()[0]:
+                        return 0
+                    cur.execute(f"""
+                        SELECT chunk_id FROM chunk_retrievals
+                        ORDER BY {_DECAYED_HITS} DESC
+                        LIMIT %s
+                    """, (limit,))
+                    ids = [row[0] for row in cur.fetchall()]
+                conn.rollback()
+            # Pin the version first so the first lookup does not wipe the warm set
+            self._sync_version(retrieval_cache.corpus_version())
+            # Least popular first, so the hottest chunks are the last to be evicted
+            ids.reverse()
+            for start in range(0, len(ids), FETCH_BATCH_SIZE):
+                self.put_many(fetch_chunks(ids[start:start + FETCH_BATCH_SIZE]))
+        except Exception as e:
+            print(f"Chunk cache warm-up failed: {e}")
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def merge_rows(rows, found):
+    """(id, distance, ...) rows -> (id, text, source, distance, ...) using ``found`` {id: (text, source)}.
+
+    Ids missing from ``found`` (deleted since the ANN query) are dropped.
+    """
+    return [(row[0], *found[row[0]], *row[1:]) for row in rows if row[0] in found]
+
+
+def without_text(rows):
+    """(id, distance, ...) rows -> (id, None, None, distance, ...), the shape search post-processing expects."""
+    return [(row[0], None, None, *row[1:]) for row in rows]
+
+
+_enabled = SEARCH_IDS_ONLY
+
+
+def configure_chunk_cache(ids_only: bool = True, max_entries: int = None):
+    """Turn ids-only searches on or off by default and optionally resize the cache."""
+    global _enabled
+    _enabled = ids_only
+    if max_entries is not None:
+        chunk_cache.max_entries = max_entries
+
+
+def ids_only_enabled() -> bool:
+    return _enabled
+
+
+chunk_cache = ChunkCache()
@@ -0,0 +1,132 @@
+# utils/chunk_writer.py
+
+import io
+import os
+import struct
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_COPY_BATCH_SIZE = int(os.getenv("COPY_BATCH_SIZE", "5000"))
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_PG_EPOCH = datetime(2000, 1, 1)
+
+
+# Binary COPY field encoders: Python value -> Postgres binary wire format
+
+def encode_text(value) -> bytes:
+    return str(value).encode("utf-8")
+
+
+def encode_int4(value) -> bytes:
+    return struct.pack(">i", int(value))
+
+
+def encode_uuid(value) -> bytes:
+    return (value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))).bytes
+
+
+def encode_timestamp(value) -> bytes:
+    # Microseconds since 2000-01-01, as Postgres stores timestamp without time zone
+    delta = value - _PG_EPOCH
+    return struct.pack(">q", (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds)
+
+
+def encode_vector(value) -> bytes:
+    # pgvector binary format: uint16 dim, uint16 unused, big-endian float32s
+    vector = np.asarray(value, dtype=">f4").reshape(-1)
+    return struct.pack(">HH", vector.shape[0], 0) + vector.tobytes()
+
+
+class ChunkCopyWriter:
+    """Streams rows into a table with binary COPY, ``batch_size`` rows per COPY.
+
+    Runs on the caller's psycopg2 connection and never commits, so a whole
+    document can be written inside a single transaction.
+    """
+
+    def __init__(self, conn, table, columns, encoders, batch_size=DEFAULT_COPY_BATCH_SIZE):
+        self.conn = conn
+        self.table = table
+        self.columns = columns
+        self.encoders = encoders
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._buffer = io.BytesIO()
+        self._pending = 0
+        self._field_count = struct.pack(">h", len(columns))
+
+    def write(self, row):
+        buf = self._buffer
+        if self._pending == 0:
+            buf.write(_COPY_HEADER)
+        buf.write(self._field_count)
+        for value, encode in zip(row, self.encoders):
+            if value is None:
+                buf.write(b"\xff\xff\xff\xff")
+                continue
+            data = encode(value)
+            buf.write(struct.pack(">i", len(data)))
+            buf.write(data)
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+        self.flush()
+        return self.rows_written
+
+    def flush(self):
+        if not self._pending:
+            return
+        self._buffer.write(_COPY_TRAILER)
+        self._buffer.seek(0)
+        with self.conn.cursor() as cur:
+            cur.copy_expert(
+                f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT binary)",
+                self._buffer,
+            )
+        self.rows_written += self._pending
+        self._buffer = io.BytesIO()
+        self._pending = 0
+
+
+def copy_legal_chunks(conn, rows, batch_size=DEFAULT_COPY_BATCH_SIZE, source_type="corpus") -> int:
+    """COPY (text, source, embedding, country, document_type, chunk_number) rows into legal_chunks.
+
+    ``source_type`` is written explicitly: tables created by the ORM before
+    it had a server default have a NOT NULL column without a DEFAULT.
+    Returns the row count.
+    """
+    writer = ChunkCopyWriter(
+        conn,
+        "legal_chunks",
+        ["text", "source", "embedding", "country", "document_type", "chunk_number", "source_type"],
+        [encode_text, encode_text, encode_vector, encode_text, encode_text, encode_int4, encode_text],
+        batch_size,
+    )
+    return writer.write_many((*row, source_type) for row in rows)
+
+
+def copy_document_chunks(conn, chunks, batch_size=DEFAULT_COPY_BATCH_SIZE) -> int:
+    """COPY processed upload chunks (dicts from DocumentService) into document_chunks."""
+    writer = ChunkCopyWriter(
+        conn,
+        "document_chunks",
+        ["id", "document_id", "content", "chunk_number", "embedding", "\"references\"", "country", "created_at"],
+        [encode_text, encode_uuid, encode_text, encode_int4, encode_vector, encode_text, encode_text,
+         encode_timestamp],
+        batch_size,
+    )
+    return writer.write_many(
+        (
+            c["id"], c["document_id"], c["content"], c["chunk_number"], c["embedding"],
+            str(c["references"]), c["country"], c["created_at"],
+        )
+        for c in chunks
+    )
@@ -1,11 +1,15 @@
 import os
+import argparse
 import fitz  # PyMuPDF
 import pytesseract
 from PIL import Image
 import io
 import json
 from utils.chunker import chunk_text
-from utils.vector_db import add_chunk, create_tables
+from utils.embedding import get_embeddings
+from utils.embedding_pool import EmbeddingPool
+from utils.retrieval_cache import bump_corpus_version
+from utils.vector_db import add_chunks, create_tables
 
 INGESTED_LOG = "data/ingested_files.json"
 
@@ -42,44 +46,58 @@ def extract_text_with_pymupdf(pdf_path):
     return full_text
 
 
-def ingest_file(file_path, source=None):
+def ingest_file(file_path, source=None, pool=None, country="nigeria", document_type="legal_document"):
     print(f"📄 Processing: {file_path}")
     text = extract_text_with_pymupdf(file_path)
 
     chunks = chunk_text(text)
-    for i, chunk in enumerate(chunks):
-        # Ensure chunk is a string, not numpy array or other type
-        if hasattr(chunk, "tolist"):
-            chunk = chunk.tolist()
-        add_chunk(chunk, source or file_path)
-        print(f"🧩 Chunk {i+1}/{len(chunks)} added.")
-    print(f"✅ {len(chunks)} chunks added from: {file_path}")
+    # Embed the whole document in batches instead of one chunk per forward pass,
+    # spread across worker processes when a pool is given
+    embeddings = pool.embed(chunks) if pool else get_embeddings(chunks)
+    # One COPY-based transaction per document instead of one INSERT per chunk
+    count = add_chunks(chunks, source or file_path, embeddings, country=country, document_type=document_type)
+    print(f"✅ {count} chunks added from: {file_path}")
 
 
-def ingest_folder(folder_path):
+def ingest_folder(folder_path, workers=1, country="nigeria", document_type="legal_document"):
     print(f"📂 Scanning folder: {folder_path}")
     create_tables()
+    pool = EmbeddingPool(workers=workers) if workers > 1 else None
 
     already_ingested = load_ingested_log()
     new_ingested = set(already_ingested)
     processed_files = 0
 
-    for fname in os.listdir(folder_path):
-        fpath = os.path.join(folder_path, fname)
-        if fname.lower().endswith(".pdf") and fpath not in already_ingested:
-            ingest_file(fpath)
-            new_ingested.add(fpath)
-            processed_files += 1
-        elif fpath in already_ingested:
-            print(f"⏩ Skipping (already ingested): {fname}")
-
+    try:
+        for fname in os.listdir(folder_path):
+            fpath = os.path.join(folder_path, fname)
+            if fname.lower().endswith(".pdf") and fpath not in already_ingested:
+                ingest_file(fpath, pool=pool, country=country, document_type=document_type)
+                new_ingested.add(fpath)
+                processed_files += 1
+            elif fpath in already_ingested:
+                print(f"⏩ Skipping (already ingested): {fname}")
+    finally:
+        # Don't leave worker processes behind when a file fails
+        if pool:
+            pool.close()
     save_ingested_log(new_ingested)
+    if processed_files:
+        # Invalidates cached retrievals in every API worker; only new chunks
+        # were added, so cached chunk texts stay valid
+        bump_corpus_version(document_ids=())
     print(f"🎉 Ingestion complete! {processed_files} new files processed.")
 
 
 if __name__ == "__main__":
-    folder = "data/legal_pdfs"
-    ingest_folder(folder)
+    parser = argparse.ArgumentParser(description="Ingest legal PDFs into legal_chunks")
+    parser.add_argument("folder", nargs="?", default="data/legal_pdfs")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="embedding worker processes (default: 1, in-process)")
+    parser.add_argument("--country", default="nigeria")
+    parser.add_argument("--document-type", default="legal_document")
+    args = parser.parse_args()
+    ingest_folder(args.folder, workers=args.workers, country=args.country, document_type=args.document_type)
 
 
 # import fitz  # PyMuPDF
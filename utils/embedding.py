@@ -1,15 +1,256 @@
 # utils/embedding.py
 
-from sentence_transformers import SentenceTransformer
+import os
+import threading
 
-# Load the local model once
-model = SentenceTransformer("all-MiniLM-L6-v2")
+import numpy as np
+
+from utils.embedding_cache import get_cache, query_cache
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+DEFAULT_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH", "data/onnx/all-MiniLM-L6-v2-int8")
+MAX_SEQ_LENGTH = 256
+
+
+class SentenceTransformerBackend:
+    """Reference backend: PyTorch inference through sentence-transformers."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def token_lengths(self, texts: list[str]) -> list[int]:
+        encoded = self.model.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.model.max_seq_length,
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).astype(np.float32, copy=False)
+
+
+class OnnxBackend:
+    """Int8-quantized MiniLM run through ONNX Runtime on CPU.
+
+    Expects a directory produced by ``python -m utils.onnx_export`` holding
+    ``model.onnx`` and ``tokenizer.json``. Output matches the reference
+    backend's pipeline: mean pooling over the attention mask, then L2 norm.
+    Without ``model_dir``, a ``model_name`` other than the default (e.g.
+    from ``utils.reindex --model``) is looked for beside DEFAULT_ONNX_PATH,
+    as ``<model>-int8``.
+    """
+
+    name = "onnx-int8"
+
+    def __init__(self, model_dir: str = None, model_name: str = MODEL_NAME):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        if model_dir is None:
+            model_dir = DEFAULT_ONNX_PATH
+            if model_name != MODEL_NAME:
+                model_dir = os.path.join(os.path.dirname(DEFAULT_ONNX_PATH), f"{model_name.split('/')[-1]}-int8")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = int(os.getenv("EMBEDDING_NUM_THREADS", "0"))
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()
+        self.dim = self.session.get_outputs()[0].shape[-1]
+
+    def token_lengths(self, texts: list[str]) -> list[int]:
+        return [len(e.ids) for e in self.tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        # Pad by hand rather than toggling tokenizer state, which is shared across threads
+        encodings = self.tokenizer.encode_batch(texts)
+        width = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), width), dtype=np.int64)
+        for row, e in enumerate(encodings):
+            input_ids[row, :len(e.ids)] = e.ids
+            attention_mask[row, :len(e.ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+# The backend is created on first use so importing this module (and
+# utils.vector_db) does not pull in torch for processes that never embed.
+_backend = None
+_backend_name = DEFAULT_BACKEND
+_backend_kwargs = {}
+_backend_lock = threading.Lock()
+
+
+def configure(backend: str = None, **kwargs):
+    """Select the embedding backend, e.g. from backend.core.config.Settings.
+
+    An already loaded backend is dropped so the next call loads the new one.
+    """
+    global _backend, _backend_name, _backend_kwargs
+    if backend is not None and backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    with _backend_lock:
+        _backend_name = backend or _backend_name
+        _backend_kwargs = kwargs
+        _backend = None
+
+
+def active_model() -> tuple:
+    """(backend name, model name) that get_embeddings currently uses."""
+    return _backend_name, _backend_kwargs.get("model_name", MODEL_NAME)
+
+
+def use_model(backend: str, model_name: str):
+    """Switch to ``backend`` / ``model_name`` unless they are already in use.
+
+    Serving processes call this with the model a reindex swap recorded in
+    the database (see utils.vector_db.apply_embedding_model).
+    """
+    if (backend, model_name) != active_model():
+        print(f"🔁 Switching embeddings to {model_name} ({backend})")
+        configure(backend, model_name=model_name)
+
+
+def get_backend():
+    """Return the shared embedding backend, loading it once on first call."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = BACKENDS[_backend_name](**_backend_kwargs)
+    return _backend
+
+
+def warm_up():
+    """Load the model and run one forward pass so the first request is not slow."""
+    get_backend().encode(["warm up"])
 
 
 def get_embedding(text: str) -> list[float]:
     """Generate a vector embedding from text."""
-    embedding = model.encode(text)
-    # Ensure output is always a list, not numpy array
-    if hasattr(embedding, "tolist"):
-        return embedding.tolist()
-    return list(embedding)
+    return get_embeddings([text])[0].tolist()
+
+
+def get_query_embedding(query: str) -> np.ndarray:
+    """Embed a search query, reusing the vector for repeated questions."""
+    cache_name = cache_namespace()
+    vector = query_cache.get(cache_name, query)
+    if vector is None:
+        vector = get_embeddings([query], use_disk_cache=False)[0]
+        query_cache.put(cache_name, query, vector)
+    return vector
+
+
+def _encode(backend, texts: list[str], batch_size: int) -> np.ndarray:
+    """Run the model over texts in length-sorted batches, keeping input order."""
+    out = np.empty((len(texts), backend.dim), dtype=np.float32)
+    if not texts:
+        return out
+
+    order = np.argsort(backend.token_lengths(texts), kind="stable")
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        out[idx] = backend.encode([texts[i] for i in idx])
+    return out
+
+
+def cache_namespace() -> str:
+    # Quantized vectors differ slightly from the reference ones, so each
+    # backend (and each model, e.g. during a reindex) gets its own namespace.
+    model_name = _backend_kwargs.get("model_name", MODEL_NAME)
+    if _backend_name == SentenceTransformerBackend.name:
+        return model_name
+    return f"{model_name}:{_backend_name}"
+
+
+def get_embeddings(texts: list[str], batch_size: int = DEFAULT_BATCH_SIZE, use_disk_cache: bool = True) -> np.ndarray:
+    """Embed many texts at once and return a (len(texts), dim) float32 matrix.
+
+    Inputs are sorted by token length before batching so each forward pass
+    pads to a similar length; rows are returned in the original order.
+    Texts already in the on-disk embedding cache are not re-encoded.
+    Queries pass ``use_disk_cache=False``: they go through the in-memory
+    query cache instead and would only churn the chunk cache on disk.
+    """
+    texts = [str(t) for t in texts]
+    cache = get_cache() if use_disk_cache else None
+    if cache is None:
+        return _encode(get_backend(), texts, batch_size)
+
+    cache_name = cache_namespace()
+    try:
+        cached = cache.get_many(cache_name, texts)
+    except Exception as e:
+        # Best effort, like the retrieval cache: e.g. "database is locked"
+        print(f"Embedding cache read failed: {e}")
+        cached = {}
+    missing = [i for i in range(len(texts)) if i not in cached]
+    if texts and not missing:
+        # Full hit: no need to load the model at all
+        return np.stack([cached[i] for i in range(len(texts))]).astype(np.float32, copy=False)
+
+    backend = get_backend()
+    out = np.empty((len(texts), backend.dim), dtype=np.float32)
+    for i, vector in cached.items():
+        out[i] = vector
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        encoded = _encode(backend, missing_texts, batch_size)
+        out[missing] = encoded
+        try:
+            cache.put_many(cache_name, missing_texts, encoded)
+        except Exception as e:
+            print(f"Embedding cache write failed: {e}")
+    return out
+
+
+def check_backend_agreement(candidate, reference, texts: list[str], min_cosine: float = 0.99) -> float:
+    """Compare two backends on texts and return the lowest cosine similarity.
+
+    Raises ValueError if any pair of vectors falls below ``min_cosine``.
+    """
+    a = candidate.encode(texts)
+    b = reference.encode(texts)
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    worst = float(cosines.min())
+    if worst < min_cosine:
+        raise ValueError(
+            f"{candidate.name} disagrees with {reference.name}: min cosine {worst:.4f} < {min_cosine}"
+        )
+    return worst
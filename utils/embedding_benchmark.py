@@ -0,0 +1,173 @@
+# utils/embedding_benchmark.py
+# Offline latency / throughput / memory benchmark for the embedding backends.
+#
+#   python -m utils.embedding_benchmark --backends sentence-transformers onnx-int8 \
+#       --threads 1 2 4 --output bench_embeddings.json
+#
+# Each (backend, threads) combination runs in a fresh process so peak RSS
+# reflects that configuration alone. Caches are bypassed: the backend is
+# called directly.
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+SUBJECTS = [
+    "the Commissioner of Police", "a person arrested without warrant", "the Attorney-General of the Federation",
+    "the Governor of a State", "any registered trade union", "the Minister", "an awaiting trial inmate",
+    "the holder of a statutory right of occupancy", "a landlord", "the Corporate Affairs Commission",
+]
+ACTIONS = [
+    "shall be brought before a court of law within a reasonable time",
+    "may, by order published in the Gazette, make regulations",
+    "shall not be subjected to torture or to inhuman or degrading treatment",
+    "is entitled to the privacy of his home, correspondence and telephone conversations",
+    "shall cause the land to be surveyed and a certificate of occupancy issued",
+    "commits an offence and is liable on conviction to a fine",
+    "may apply to the High Court for redress",
+]
+QUALIFIERS = [
+    "notwithstanding anything contained in any other enactment",
+    "subject to the provisions of subsection (2) of this section",
+    "save as otherwise provided by this Act",
+    "within the period prescribed under the Schedule to this Act",
+    "in accordance with the Constitution of the Federal Republic of Nigeria 1999",
+]
+QUESTIONS = [
+    "Should police search my phone?", "How long can police detain me without charge?",
+    "What is an awaiting trial inmate?", "Can my landlord evict me without notice?",
+    "What does Section 35 of the Constitution say?", "Who owns land under the Land Use Act?",
+]
+
+
+def synthetic_corpus(n: int, words: int = 500, seed: int = 0) -> list[str]:
+    """Generate statute-like chunks of roughly ``words`` words, like utils.chunker output."""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(n):
+        parts = []
+        while sum(len(p.split()) for p in parts) < words:
+            section = rng.randint(1, 320)
+            parts.append(
+                f"{section}. ({rng.randint(1, 6)}) {rng.choice(SUBJECTS).capitalize()} "
+                f"{rng.choice(ACTIONS)}, {rng.choice(QUALIFIERS)}."
+            )
+        # Vary lengths so batching sees realistic padding
+        chunks.append(" ".join(" ".join(parts).split()[:rng.randint(words // 4, words)]))
+    return chunks
+
+
+def percentiles(samples_ms: list[float]) -> dict:
+    arr = np.asarray(samples_ms)
+    return {
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "mean_ms": float(arr.mean()),
+    }
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_config(backend_name, threads, query_runs, batch_sizes, corpus_size, result_queue):
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["EMBEDDING_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from utils import embedding
+
+    start = time.perf_counter()
+    backend = embedding.BACKENDS[backend_name]()
+    load_s = time.perf_counter() - start
+    backend.encode(["warm up"])
+
+    queries = [QUESTIONS[i % len(QUESTIONS)] for i in range(query_runs)]
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        backend.encode([q])
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    corpus = synthetic_corpus(corpus_size)
+    throughput = {}
+    for batch_size in batch_sizes:
+        t0 = time.perf_counter()
+        embedding._encode(backend, corpus, batch_size)
+        elapsed = time.perf_counter() - t0
+        throughput[str(batch_size)] = {
+            "seconds": elapsed,
+            "chunks_per_sec": len(corpus) / elapsed,
+        }
+
+    result_queue.put({
+        "backend": backend_name,
+        "threads": threads,
+        "model_load_s": load_s,
+        "query_latency": percentiles(latencies),
+        "batch_throughput": throughput,
+        "peak_rss_mb": _peak_rss_mb(),
+    })
+
+
+def run_benchmark(backends, threads, query_runs=200, batch_sizes=(1, 8, 32, 64), corpus_size=256) -> dict:
+    ctx = mp.get_context("spawn")
+    results = []
+    for backend_name in backends:
+        for n in threads:
+            result_queue = ctx.Queue()
+            proc = ctx.Process(
+                target=_run_config,
+                args=(backend_name, n, query_runs, list(batch_sizes), corpus_size, result_queue),
+            )
+            proc.start()
+            proc.join()
+            try:
+                results.append(result_queue.get(timeout=5))
+            except queue.Empty:
+                results.append({"backend": backend_name, "threads": n, "error": f"exit code {proc.exitcode}"})
+                continue
+            print(f"⏱️  {backend_name} ({n} threads): p50 {results[-1]['query_latency']['p50_ms']:.1f} ms")
+
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "query_runs": query_runs,
+        "corpus_size": corpus_size,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", default=["sentence-transformers"])
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, os.cpu_count() or 1])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--corpus-size", type=int, default=256)
+    parser.add_argument("--output", default="bench_embeddings.json")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.backends, args.threads, args.queries, args.batch_sizes, args.corpus_size)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
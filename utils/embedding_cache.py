@@ -0,0 +1,232 @@
+# utils/embedding_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+
+# SQLite's default limit on host parameters per statement is 999
+_LOOKUP_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-chunked but identical text hashes the same."""
+    return " ".join(str(text).split())
+
+
+def content_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk embedding store keyed by (model name, sha256 of normalized text).
+
+    Vectors are stored as raw float32 blobs. When the cache grows past
+    ``max_entries`` the least recently used rows are evicted. The row count
+    is kept in memory and only re-read from the table when it says the cache
+    is full, since other processes may share the file.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, key)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model_name: str, texts: list[str]) -> dict[int, np.ndarray]:
+        """Return {position: vector} for every text already in the cache."""
+        keys = [content_key(t) for t in texts]
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model_name, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                    [(now, model_name, key) for key in found],
+                )
+
+            result = {i: found[key] for i, key in enumerate(keys) if key in found}
+            self.hits += len(result)
+            self.misses += len(keys) - len(result)
+        return result
+
+    def put_many(self, model_name: str, texts: list[str], vectors: np.ndarray):
+        """Store vectors for texts, then evict the oldest rows if over capacity."""
+        if len(texts) == 0:
+            return
+        now = time.time()
+        rows = [
+            (model_name, content_key(t), int(v.shape[0]), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            try:
+                # A (model, key) pair always maps to the same vector, so an existing
+                # row (e.g. written by another process) can be kept as is
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, key, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                # Leave the connection usable for the next call
+                self._conn.execute("ROLLBACK")
+                raise
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return
+        deleted = self._conn.execute("""
+            DELETE FROM embeddings WHERE (model, key) IN (
+                SELECT model, key FROM embeddings ORDER BY last_used LIMIT ?
+            )
+        """, (excess,)).rowcount
+        self._count -= deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingCache:
+    """Bounded in-memory LRU of normalized query -> embedding with a TTL.
+
+    Sits in front of the model for chat queries, which repeat far more often
+    than chunk texts; the on-disk cache above is for bulk ingestion.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        # all-MiniLM-L6-v2 is uncased, so case and spacing never change the vector
+        return " ".join(str(query).lower().split())
+
+    def get(self, model_name: str, query: str):
+        key = (model_name, self.normalize(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, model_name: str, query: str, vector: np.ndarray):
+        key = (model_name, self.normalize(query))
+        with self._lock:
+            self._entries[key] = (vector, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+query_cache = QueryEmbeddingCache()
+
+
+def get_cache():
+    """Return the process-wide cache, or None when disabled via EMBEDDING_CACHE_PATH=''.
+
+    Also None when the cache file cannot be opened (e.g. a read-only
+    filesystem): the cache is an optimization, so embedding goes on without it.
+    """
+    global _cache, _cache_failed
+    if not DEFAULT_CACHE_PATH or _cache_failed:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None and not _cache_failed:
+                try:
+                    _cache = EmbeddingCache()
+                except Exception as e:
+                    print(f"Embedding cache unavailable, embedding without it: {e}")
+                    _cache_failed = True
+    return _cache
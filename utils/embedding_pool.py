@@ -0,0 +1,107 @@
+# utils/embedding_pool.py
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils import embedding
+from utils.embedding_cache import get_cache
+
+DEFAULT_SHARD_SIZE = 256
+# Smaller shards cost more in IPC than spreading them over idle workers gains
+MIN_SHARD_SIZE = 32
+
+
+def _init_worker(backend_name, backend_kwargs, threads):
+    # One intra-op thread per process by default so N workers use N cores
+    # instead of oversubscribing them.
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["EMBEDDING_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    embedding.configure(backend_name, **backend_kwargs)
+    embedding.warm_up()
+
+
+def _embed_shard(texts, batch_size):
+    # The parent process handles the embedding cache; workers only encode
+    return embedding._encode(embedding.get_backend(), texts, batch_size)
+
+
+class EmbeddingPool:
+    """Shards bulk embedding work across worker processes.
+
+    Each worker loads the model once. Results come back in input order so
+    they can be zipped straight onto the chunks for DB insertion.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        batch_size: int = embedding.DEFAULT_BATCH_SIZE,
+        threads_per_worker: int = 1,
+        backend: str = None,
+        **backend_kwargs,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        # spawn avoids forking a process that may already hold torch threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend or embedding._backend_name, backend_kwargs, threads_per_worker),
+        )
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embed texts across the pool and return a (len(texts), dim) float32 matrix."""
+        texts = [str(t) for t in texts]
+        cache = get_cache()
+        cache_name = embedding.cache_namespace()
+        cached = cache.get_many(cache_name, texts) if cache is not None else {}
+        missing = [i for i in range(len(texts)) if i not in cached]
+
+        encoded = None
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            # One statute PDF is often a shard or two at full size; split it
+            # so every worker gets a share
+            per_worker = -(-len(missing_texts) // self.workers)
+            shard_size = min(self.shard_size, max(MIN_SHARD_SIZE, per_worker))
+            shards = [
+                missing_texts[start:start + shard_size]
+                for start in range(0, len(missing_texts), shard_size)
+            ]
+            # map() yields results in submission order
+            encoded = np.vstack(list(self._executor.map(
+                _embed_shard, shards, [self.batch_size] * len(shards)
+            )))
+            if cache is not None:
+                cache.put_many(cache_name, missing_texts, encoded)
+
+        if encoded is None:
+            if not texts:
+                return np.empty((0, 0), dtype=np.float32)
+            return np.stack([cached[i] for i in range(len(texts))]).astype(np.float32, copy=False)
+
+        out = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        for i, vector in cached.items():
+            out[i] = vector
+        out[missing] = encoded
+        return out
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
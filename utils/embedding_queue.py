@@ -0,0 +1,124 @@
+# utils/embedding_queue.py
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.embedding import cache_namespace, get_embeddings
+from utils.embedding_cache import query_cache
+
+DEFAULT_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent query embeddings into one forward pass.
+
+    Callers ``await embed(text)``. The first request in an empty queue waits
+    up to ``max_wait_ms`` for others to arrive (or until ``max_batch`` is
+    reached), then the whole batch is encoded in a worker thread so the
+    event loop keeps serving requests while the model runs.
+    """
+
+    def __init__(self, max_batch: int = DEFAULT_MAX_BATCH, max_wait_ms: float = DEFAULT_MAX_WAIT_MS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        # A single worker keeps forward passes from competing for the same cores
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self.batches = 0
+        self.requests = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        self._ensure_worker(loop)
+        future = loop.create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    def _ensure_worker(self, loop):
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                # Queries are cached in memory by embed_query, not in the on-disk chunk cache
+                vectors = await loop.run_in_executor(
+                    self._executor, functools.partial(get_embeddings, texts, use_disk_cache=False)
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+
+_batcher = None
+
+
+def configure_batcher(max_batch: int = DEFAULT_MAX_BATCH, max_wait_ms: float = DEFAULT_MAX_WAIT_MS) -> EmbeddingBatcher:
+    """Replace the shared batcher, e.g. with values from backend.core.config.Settings."""
+    global _batcher
+    _batcher = EmbeddingBatcher(max_batch=max_batch, max_wait_ms=max_wait_ms)
+    return _batcher
+
+
+def get_batcher() -> EmbeddingBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher()
+    return _batcher
+
+
+async def embed_query(text: str) -> np.ndarray:
+    """Embed one query through the shared micro-batching queue."""
+    cache_name = cache_namespace()
+    vector = query_cache.get(cache_name, text)
+    if vector is None:
+        vector = await get_batcher().embed(text)
+        query_cache.put(cache_name, text, vector)
+    return vector
@@ -0,0 +1,375 @@
+# utils/faiss_store.py
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.retrieval_cache import CORPUS_VERSION_TTL
+
+DEFAULT_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", "data/vector_store")
+HNSW_M = 32
+EF_SEARCH = {"fast": 20, "balanced": 64}
+# Filtered searches scan slices up to this many rows exactly; larger ones go
+# through HNSW restricted to the slice
+EXACT_SLICE_ROWS = int(os.getenv("LOCAL_EXACT_SLICE_ROWS", "20000"))
+# Upper bound on how much efSearch grows for a narrow filter
+MAX_EF_SCALE = 16
+_FILTER_CACHE_SIZE = 256
+_FETCH_BATCH = 2000
+
+
+class LocalVectorStore:
+    """Read-only, in-process copy of legal_chunks for search without Postgres.
+
+    Layout of ``path``:
+      embeddings.f32  row-major float32 matrix, opened with np.memmap
+      hnsw.faiss      FAISS HNSW index over the same rows
+      chunks.sqlite3  row -> (id, text, source, country, document_type, document_id, chunk_number, owner_user_id)
+      meta.json       row count, dimension and build time
+
+    Everything is memory-mapped or paged in on demand, so several worker
+    processes on one host share the same pages through the OS page cache.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.count = meta["count"]
+        self.dim = meta["dim"]
+        # Build time doubles as the corpus version for the retrieval cache
+        self.version = int(meta.get("built_at", 0))
+        if self.count:
+            self.embeddings = np.memmap(
+                os.path.join(path, "embeddings.f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim)
+            )
+        else:
+            self.embeddings = np.empty((0, self.dim), dtype=np.float32)
+        self.index = self._load_index(os.path.join(path, "hnsw.faiss"))
+        self._chunks = sqlite3.connect(
+            f"file:{os.path.join(path, 'chunks.sqlite3')}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        # The store never changes once opened, so filter results can be kept
+        self._filters = OrderedDict()
+        columns = {row[1] for row in self._chunks.execute("PRAGMA table_info(chunks)")}
+        if "owner_user_id" in columns:
+            self._owned = self._chunks.execute(
+                "SELECT 1 FROM chunks WHERE owner_user_id IS NOT NULL LIMIT 1"
+            ).fetchone() is not None
+            self._owner_column = "owner_user_id"
+        else:
+            # Built before uploads had owners: keep every upload (document_id set) out
+            self._owned = True
+            self._owner_column = None
+
+    def _visible(self, alias, owner_user_id):
+        """SQL condition and params for rows ``owner_user_id`` may see: the corpus plus their own uploads."""
+        if self._owner_column is None:
+            return f"{alias}.document_id IS NULL", []
+        return f"({alias}.owner_user_id IS NULL OR {alias}.owner_user_id = ?)", [owner_user_id]
+
+    @staticmethod
+    def _load_index(index_path):
+        try:
+            import faiss
+        except ImportError:
+            # Fall back to exact NumPy search over the memmap
+            return None
+        if not os.path.exists(index_path):
+            return None
+        try:
+            return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every FAISS build can mmap HNSW; load it into memory instead
+            return faiss.read_index(index_path)
+
+    def filter_rows(self, country=None, document_type=None, source=None, owner_user_id=None):
+        """Row numbers matching the metadata filters and visible to ``owner_user_id``, or None when all are."""
+        clauses, params = [], []
+        for column, value in (("country", country), ("document_type", document_type), ("source", source)):
+            if value is not None:
+                clauses.append(f"chunks.{column} = ?")
+                params.append(value)
+        if self._owned:
+            visible, visible_params = self._visible("chunks", owner_user_id)
+            clauses.append(visible)
+            params.extend(visible_params)
+        if not clauses:
+            return None
+        key = (country, document_type, source, owner_user_id)
+        with self._lock:
+            if key in self._filters:
+                self._filters.move_to_end(key)
+                return self._filters[key]
+            rows = self._chunks.execute(f"SELECT row FROM chunks WHERE {' AND '.join(clauses)}", params)
+            allowed = np.fromiter((r[0] for r in rows), dtype=np.int64)
+            self._filters[key] = allowed
+            if len(self._filters) > _FILTER_CACHE_SIZE:
+                self._filters.popitem(last=False)
+            return allowed
+
+    def search_rows(self, embedding, k=5, recall="balanced", country=None, document_type=None, source=None,
+                    owner_user_id=None):
+        """Return (row numbers, L2 distances) of the k nearest stored vectors."""
+        query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        k = min(k, self.count)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        allowed = self.filter_rows(country, document_type, source, owner_user_id)
+        if allowed is not None:
+            k = min(k, len(allowed))
+            if k <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            if self.index is not None and recall != "exact" and len(allowed) > EXACT_SLICE_ROWS:
+                found = self._search_slice(query, k, recall, allowed)
+                if found is not None:
+                    return found
+            return self._exact_slice(query, k, allowed)
+
+        if self.index is None or recall == "exact":
+            distances = ((self.embeddings - query) ** 2).sum(axis=1)
+            rows = np.argpartition(distances, k - 1)[:k]
+            rows = rows[np.argsort(distances[rows])]
+            return rows, np.sqrt(distances[rows])
+
+        with self._lock:
+            # efSearch lives on the shared index object
+            self.index.hnsw.efSearch = max(EF_SEARCH.get(recall, EF_SEARCH["balanced"]), k)
+            distances, rows = self.index.search(query, k)
+        keep = rows[0] >= 0
+        # FAISS reports squared L2; pgvector's <-> is plain L2
+        return rows[0][keep], np.sqrt(distances[0][keep])
+
+    def _exact_slice(self, query, k, allowed):
+        """Exact search over just the matching slice of the corpus."""
+        distances = ((self.embeddings[allowed] - query) ** 2).sum(axis=1)
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.argsort(distances[best])]
+        return allowed[best], np.sqrt(distances[best])
+
+    def _search_slice(self, query, k, recall, allowed):
+        """HNSW search restricted to ``allowed`` rows, or None when too few matches come back.
+
+        The narrower the slice, the more of the graph a search walks past, so
+        efSearch grows with count / len(allowed) (up to MAX_EF_SCALE times).
+        FAISS builds without search-time selectors over-fetch by the same
+        factor and drop rows outside the slice afterwards.
+        """
+        import faiss
+
+        scale = min(MAX_EF_SCALE, -(-self.count // len(allowed)))
+        ef = max(EF_SEARCH.get(recall, EF_SEARCH["balanced"]), k) * scale
+        if hasattr(faiss, "SearchParametersHNSW"):
+            params = faiss.SearchParametersHNSW(sel=faiss.IDSelectorBatch(allowed), efSearch=ef)
+            # Per-call parameters leave the shared index untouched, so no lock
+            distances, rows = self.index.search(query, k, params=params)
+            keep = rows[0] >= 0
+        else:
+            fetch_k = min(k * scale, self.count)
+            with self._lock:
+                self.index.hnsw.efSearch = max(ef, fetch_k)
+                distances, rows = self.index.search(query, fetch_k)
+            keep = (rows[0] >= 0) & np.isin(rows[0], allowed)
+        if keep.sum() < k:
+            return None
+        # FAISS reports squared L2; pgvector's <-> is plain L2
+        return rows[0][keep][:k], np.sqrt(distances[0][keep][:k])
+
+    def fetch(self, rows, with_embeddings=False):
+        """Return (id, text, source) tuples for row numbers, in the given order.
+
+        ``with_embeddings`` appends each row's vector.
+        """
+        rows = [int(r) for r in rows]
+        if not rows:
+            return []
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            found = {
+                row: (chunk_id, text, source)
+                for row, chunk_id, text, source in self._chunks.execute(
+                    f"SELECT row, id, text, source FROM chunks WHERE row IN ({placeholders})", rows
+                )
+            }
+        if with_embeddings:
+            return [(*found[r], np.asarray(self.embeddings[r])) for r in rows if r in found]
+        return [found[r] for r in rows if r in found]
+
+    def neighbors(self, ids, window, owner_user_id=None):
+        """(hit id, document_id, chunk_number, text) rows, like the legal_chunks_neighbors statement."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        neighbor_visible, neighbor_params = self._visible("c", owner_user_id)
+        hit_visible, hit_params = self._visible("hit", owner_user_id)
+        with self._lock:
+            return self._chunks.execute(f"""
+                SELECT hit.id, hit.document_id, c.chunk_number, c.text
+                FROM chunks hit
+                JOIN chunks c
+                  ON c.source = hit.source
+                 AND c.document_id IS hit.document_id
+                 AND c.chunk_number BETWEEN hit.chunk_number - ? AND hit.chunk_number + ?
+                 AND {neighbor_visible}
+                WHERE hit.id IN ({placeholders}) AND {hit_visible}
+                ORDER BY hit.id, c.chunk_number
+            """, [window, window, *neighbor_params, *ids, *hit_params]).fetchall()
+
+    def _to_metric(self, embedding, rows, l2_distances):
+        """Convert L2 distances to VECTOR_DISTANCE, so rows match what pgvector would return."""
+        from utils.vector_db import VECTOR_DISTANCE
+        if VECTOR_DISTANCE == "l2" or len(rows) == 0:
+            return l2_distances
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        dots = np.asarray(self.embeddings[rows]) @ query
+        if VECTOR_DISTANCE == "ip":
+            # pgvector's <#> is the negative inner product
+            return -dots
+        norms = np.linalg.norm(self.embeddings[rows], axis=1) * np.linalg.norm(query)
+        return 1.0 - dots / np.maximum(norms, 1e-12)
+
+    def search(self, embedding, k=5, recall="balanced", country=None, document_type=None, source=None,
+               with_embeddings=False, owner_user_id=None):
+        """Same result shape as vector_db.query_similar_chunks: [(id, text, source, distance), ...].
+
+        ``with_embeddings`` appends each row's vector, as the pgvector
+        ``*_embeddings`` statements do. Uploads only match their ``owner_user_id``.
+        """
+        rows, distances = self.search_rows(embedding, k, recall, country, document_type, source, owner_user_id)
+        distances = self._to_metric(embedding, rows, distances)
+        found = self.fetch(rows, with_embeddings)
+        # fetch() keeps input order and every searched row exists in the table
+        return [(*hit[:3], float(d), *hit[3:]) for hit, d in zip(found, distances)]
+
+
+def rebuild(path: str = DEFAULT_STORE_PATH, hnsw_m: int = HNSW_M, ef_construction: int = 200) -> int:
+    """Export legal_chunks from Postgres into a fresh local store and swap it in.
+
+    The new store is written beside the old one and renamed into place, so
+    processes that still have the old files mapped keep working.
+    """
+    from utils.vector_db import get_connection
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM legal_chunks WHERE embedding IS NOT NULL")
+            count = cur.fetchone()[0]
+            cur.execute("SELECT vector_dims(embedding) FROM legal_chunks WHERE embedding IS NOT NULL LIMIT 1")
+            first = cur.fetchone()
+        dim = first[0] if first else 0
+
+        embeddings = np.memmap(
+            os.path.join(tmp_path, "embeddings.f32"), dtype=np.float32, mode="w+", shape=(max(count, 1), max(dim, 1))
+        )
+        chunks = sqlite3.connect(os.path.join(tmp_path, "chunks.sqlite3"))
+        chunks.execute("""
+            CREATE TABLE chunks (
+                row INTEGER PRIMARY KEY, id INTEGER, text TEXT, source TEXT, country TEXT, document_type TEXT,
+                document_id TEXT, chunk_number INTEGER, owner_user_id TEXT
+            )
+        """)
+
+        # Named (server-side) cursor streams rows instead of loading the table at once
+        row = 0
+        with conn.cursor(name="local_store_export") as cur:
+            cur.itersize = _FETCH_BATCH
+            cur.execute("""
+                SELECT id, text, source, embedding, country, document_type, document_id::text, chunk_number,
+                       owner_user_id
+                FROM legal_chunks
+                WHERE embedding IS NOT NULL
+                ORDER BY id
+            """)
+            while row < count:
+                batch = cur.fetchmany(_FETCH_BATCH)
+                if not batch:
+                    break
+                batch = batch[:count - row]
+                embeddings[row:row + len(batch)] = np.stack([np.asarray(r[3], dtype=np.float32) for r in batch])
+                chunks.executemany(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(row + i, r[0], r[1], r[2], r[4], r[5], r[6], r[7], r[8]) for i, r in enumerate(batch)],
+                )
+                row += len(batch)
+        conn.rollback()
+
+    embeddings.flush()
+    chunks.execute("CREATE INDEX chunks_metadata_idx ON chunks (country, document_type)")
+    chunks.execute("CREATE INDEX chunks_id_idx ON chunks (id)")
+    chunks.execute("CREATE INDEX chunks_neighbors_idx ON chunks (source, chunk_number)")
+    chunks.commit()
+    chunks.close()
+
+    try:
+        import faiss
+        if row:
+            index = faiss.IndexHNSWFlat(dim, hnsw_m)
+            index.hnsw.efConstruction = ef_construction
+            index.add(np.ascontiguousarray(embeddings[:row]))
+            faiss.write_index(index, os.path.join(tmp_path, "hnsw.faiss"))
+    except ImportError:
+        print("⚠️ faiss not installed; the local store will use exact NumPy search.")
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"count": row, "dim": dim, "built_at": int(time.time())}, f)
+
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return row
+
+
+_store = None
+_store_lock = threading.Lock()
+_store_checked_at = 0.0
+
+
+def _built_at(path: str) -> int:
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            return int(json.load(f).get("built_at", 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def get_store() -> LocalVectorStore:
+    """The shared store, reopened when `build-local` has swapped in a newer build.
+
+    meta.json is re-read at most every CORPUS_VERSION_TTL seconds. Searches
+    still running on the old store keep their mapping until they finish.
+    """
+    global _store, _store_checked_at
+    now = time.monotonic()
+    if _store is None or now - _store_checked_at > CORPUS_VERSION_TTL:
+        with _store_lock:
+            if _store is None:
+                _store = LocalVectorStore()
+            elif now - _store_checked_at > CORPUS_VERSION_TTL:
+                built_at = _built_at(_store.path)
+                if built_at and built_at != _store.version:
+                    _store = LocalVectorStore(_store.path)
+            _store_checked_at = now
+    return _store
+
+
+def reload_store():
+    """Drop the cached store so the next search opens a freshly rebuilt one."""
+    global _store
+    with _store_lock:
+        _store = None
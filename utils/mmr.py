@@ -0,0 +1,47 @@
+# utils/mmr.py
+
+import numpy as np
+
+
+def mmr_select(query_embedding, embeddings, k: int, lambda_mult: float = 0.5, ranked: bool = False) -> list[int]:
+    """Pick k diverse candidates with maximal marginal relevance.
+
+    Each step takes the candidate maximising
+    ``lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, selected)``.
+    ``lambda_mult=1`` keeps plain relevance order; lower values penalise
+    near-duplicates such as overlapping chunks of the same passage harder.
+    Embeddings are unit-normalized, so dot products are cosine similarities.
+
+    ``ranked=True`` means ``embeddings`` are already in relevance order from
+    another ranker (e.g. RRF-fused hybrid search). Their query similarities
+    are then reassigned by position, best to the first candidate, so that
+    order is kept while relevance stays on the same scale as redundancy.
+
+    Returns indices into ``embeddings`` in selection order.
+    """
+    candidates = np.asarray(embeddings, dtype=np.float32)
+    n = candidates.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    relevance = candidates @ query
+    if ranked:
+        relevance = np.sort(relevance)[::-1]
+    # Candidate pools are small (tens of rows), so the full similarity matrix is cheap
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
@@ -0,0 +1,64 @@
+# utils/onnx_export.py
+# Export all-MiniLM-L6-v2 to an int8-quantized ONNX model for the
+# "onnx-int8" embedding backend, then check it against the PyTorch model.
+#
+#   python -m utils.onnx_export [output_dir]
+
+import os
+import sys
+
+from utils.embedding import (
+    DEFAULT_ONNX_PATH,
+    MODEL_NAME,
+    OnnxBackend,
+    SentenceTransformerBackend,
+    check_backend_agreement,
+)
+
+SAMPLE_TEXTS = [
+    "Every citizen is entitled to the privacy of his home, correspondence, telephone conversations and telegraphic communications.",
+    "A police officer may search a suspect only with a warrant issued by a magistrate, save as otherwise provided in this Act.",
+    "Section 35 of the Constitution of the Federal Republic of Nigeria 1999 guarantees the right to personal liberty.",
+    "The Land Use Act vests all land comprised in the territory of each State in the Governor of that State.",
+    "Should police search my phone?",
+]
+
+
+def export(output_dir: str = DEFAULT_ONNX_PATH, min_cosine: float = 0.99) -> float:
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    reference = SentenceTransformerBackend(MODEL_NAME)
+    transformer = reference.model[0].auto_model.eval()
+    tokenizer = reference.model.tokenizer
+
+    dummy = tokenizer(["export"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, "model-fp32.onnx")
+    dynamic = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes={
+                "input_ids": dynamic,
+                "attention_mask": dynamic,
+                "token_type_ids": dynamic,
+                "last_hidden_state": dynamic,
+            },
+            opset_version=14,
+        )
+    quantize_dynamic(fp32_path, os.path.join(output_dir, "model.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, "tokenizer.json"))
+
+    return check_backend_agreement(OnnxBackend(output_dir), reference, SAMPLE_TEXTS, min_cosine)
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ONNX_PATH
+    worst = export(target)
+    print(f"✅ Exported int8 ONNX model to {target} (min cosine vs reference: {worst:.4f})")
@@ -0,0 +1,63 @@
+# utils/passages.py
+
+# Longest chunk overlap looked for when stitching neighbors together; both
+# chunkers overlap by less (utils.chunker: 50 words, uploads: 20 words)
+MAX_OVERLAP_WORDS = 200
+
+
+def join_chunks(texts, max_overlap: int = MAX_OVERLAP_WORDS) -> str:
+    """Concatenate consecutive chunks, dropping the words each one repeats from the previous."""
+    words = []
+    for text in texts:
+        following = text.split()
+        overlap = 0
+        for n in range(min(max_overlap, len(words), len(following)), 0, -1):
+            if words[-n:] == following[:n]:
+                overlap = n
+                break
+        words.extend(following[overlap:])
+    return " ".join(words)
+
+
+def merge_passages(rows, neighbors):
+    """Small-to-big: replace ranked (id, text, source, distance) hits with the passages around them.
+
+    ``neighbors`` are (hit id, document_id, chunk_number, text) rows: the
+    chunks within the window of each hit, the hit included. Hits whose
+    windows touch or overlap in the same document become one passage,
+    which keeps the id and rank of its best-ranked hit and the smallest
+    distance. Hits without neighbor rows (no chunk_number) pass through.
+    """
+    windows = {}
+    for hit_id, document_id, number, text in neighbors:
+        windows.setdefault(hit_id, (document_id, {}))[1][number] = text
+
+    groups = {}
+    passages = []
+    for rank, row in enumerate(rows):
+        if row[0] not in windows:
+            passages.append((rank, row))
+            continue
+        document_id, chunks = windows[row[0]]
+        groups.setdefault((row[2], document_id), []).append((min(chunks), max(chunks), rank, row, chunks))
+
+    for spans in groups.values():
+        spans.sort(key=lambda span: span[0])
+        merged = []
+        for lo, hi, rank, row, chunks in spans:
+            if merged and lo <= merged[-1]["hi"] + 1:
+                current = merged[-1]
+                current["hi"] = max(current["hi"], hi)
+                current["chunks"].update(chunks)
+                current["distance"] = min(current["distance"], row[3])
+                if rank < current["rank"]:
+                    current["rank"], current["row"] = rank, row
+            else:
+                merged.append({"hi": hi, "rank": rank, "row": row, "chunks": dict(chunks), "distance": row[3]})
+        for passage in merged:
+            chunks, row = passage["chunks"], passage["row"]
+            text = join_chunks([chunks[n] for n in sorted(chunks)])
+            passages.append((passage["rank"], (row[0], text, row[2], passage["distance"])))
+
+    passages.sort(key=lambda passage: passage[0])
+    return [row for _, row in passages]
@@ -0,0 +1,337 @@
+# utils/reindex.py
+# Blue/green re-embedding of legal_chunks.
+#
+#   python -m utils.reindex run --model sentence-transformers/all-mpnet-base-v2 --throttle-ms 200
+#
+# "build" re-embeds the stored chunk text into legal_chunks_shadow and
+# recreates every index of the live table on it. "swap" catches up with rows
+# written since, then renames the tables in one transaction. "run" does both.
+# Search statements refer to legal_chunks by name, so after the swap every
+# pooled connection re-plans against the new table without a restart.
+#
+# The swap also records the new backend, model and dimension in the
+# embedding_model table and gives document_chunks the new vectors. Serving
+# processes read that row along with the corpus version (at most
+# CORPUS_VERSION_TTL seconds later) and switch models on their own.
+
+import argparse
+import hashlib
+import re
+import time
+
+from utils import embedding
+from utils.chunk_writer import ChunkCopyWriter, encode_int4, encode_text, encode_uuid, encode_vector
+from utils.embedding_pool import EmbeddingPool
+from utils.retrieval_cache import bump_corpus_version
+from utils.vector_db import get_connection
+
+LIVE_TABLE = "legal_chunks"
+SHADOW_TABLE = "legal_chunks_shadow"
+PREVIOUS_TABLE = "legal_chunks_previous"
+DEFAULT_BATCH_SIZE = 500
+# Catch-up passes stop once fewer rows than this are left, and the rest is
+# copied while writes are blocked
+SWAP_CATCH_UP_ROWS = 1000
+# Postgres silently truncates longer identifiers (NAMEDATALEN - 1)
+MAX_IDENTIFIER_LENGTH = 63
+
+_COLUMNS = ["id", "text", "source", "embedding", "country", "document_type", "source_type", "document_id", "chunk_key",
+            "chunk_number", "owner_user_id"]
+_ENCODERS = [encode_int4, encode_text, encode_text, encode_vector, encode_text, encode_text, encode_text,
+             encode_uuid, encode_text, encode_int4, encode_text]
+_SELECT = ("SELECT l.id, l.text, l.source, l.country, l.document_type, l.source_type, l.document_id, l.chunk_key, "
+           "l.chunk_number, l.owner_user_id")
+
+
+def derived_index_name(name: str, suffix: str) -> str:
+    """``name + suffix``, or a truncated name with a hash of the full one when that would not fit in 63 bytes."""
+    if len((name + suffix).encode()) <= MAX_IDENTIFIER_LENGTH:
+        return name + suffix
+    digest = hashlib.sha1(name.encode()).hexdigest()[:8]
+    keep = MAX_IDENTIFIER_LENGTH - len(suffix) - len(digest) - 1
+    return f"{name.encode()[:keep].decode(errors='ignore')}_{digest}{suffix}"
+
+
+def _index_names(cur, table):
+    cur.execute("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(%s) AND NOT i.indisprimary
+    """, (table,))
+    return [row[0] for row in cur.fetchall()]
+
+
+class Reindexer:
+    """Rebuilds legal_chunks from its own text with the configured embedding backend.
+
+    Progress is the highest id copied into the shadow table: each batch is
+    committed on its own, so an interrupted build resumes where it stopped.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, throttle_ms=0, workers=1, backend=None, **backend_kwargs):
+        self.batch_size = batch_size
+        self.throttle = throttle_ms / 1000.0
+        embedding.configure(backend, **backend_kwargs)
+        self.pool = EmbeddingPool(workers=workers, backend=backend, **backend_kwargs) if workers > 1 else None
+        self.model = embedding.cache_namespace()
+
+    def _embed(self, texts):
+        return self.pool.embed(texts) if self.pool else embedding.get_embeddings(texts)
+
+    def _copy_rows(self, conn, rows):
+        """Embed rows selected with _SELECT and COPY them into the shadow table."""
+        vectors = self._embed([r[1] for r in rows])
+        writer = ChunkCopyWriter(conn, SHADOW_TABLE, _COLUMNS, _ENCODERS, batch_size=len(rows))
+        return writer.write_many((r[0], r[1], r[2], v, *r[3:]) for r, v in zip(rows, vectors))
+
+    def create_shadow(self, restart=False):
+        """Create the shadow table, or check that an existing one was built with the same model."""
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (SHADOW_TABLE,))
+                comment = cur.fetchone()[0]
+                cur.execute("SELECT to_regclass(%s) IS NOT NULL", (SHADOW_TABLE,))
+                exists = cur.fetchone()[0]
+                if exists and not restart:
+                    if comment != f"model={self.model}":
+                        raise ValueError(
+                            f"{SHADOW_TABLE} was started with {comment!r}, not model={self.model}; "
+                            "rerun with --restart to discard it."
+                        )
+                    return
+                cur.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+                # Shares the live id sequence, so ids stay stable across the swap
+                cur.execute(f"""
+                    CREATE TABLE {SHADOW_TABLE}
+                    (LIKE {LIVE_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)
+                """)
+                cur.execute(f"ALTER TABLE {SHADOW_TABLE} ADD PRIMARY KEY (id)")
+                dim = embedding.get_backend().dim
+                cur.execute(f"ALTER TABLE {SHADOW_TABLE} ALTER COLUMN embedding TYPE vector({int(dim)})")
+                cur.execute(f"COMMENT ON TABLE {SHADOW_TABLE} IS %s", (f"model={self.model}",))
+            conn.commit()
+
+    def build(self, restart=False) -> int:
+        """Copy and re-embed live rows into the shadow table, then index it."""
+        self.create_shadow(restart)
+        copied = 0
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT coalesce(max(id), 0) FROM {SHADOW_TABLE}")
+                last_id = cur.fetchone()[0]
+            if last_id:
+                print(f"⏩ Resuming after id {last_id}")
+            while True:
+                # Keyset pages in short transactions: nothing pins a snapshot
+                # on the live table while the batch is embedded or throttled
+                with conn.cursor() as cur:
+                    cur.execute(
+                        f"{_SELECT} FROM {LIVE_TABLE} l WHERE l.id > %s ORDER BY l.id LIMIT %s",
+                        (last_id, self.batch_size),
+                    )
+                    rows = cur.fetchall()
+                conn.commit()
+                if not rows:
+                    break
+                copied += self._copy_rows(conn, rows)
+                conn.commit()
+                last_id = rows[-1][0]
+                print(f"📦 {copied} chunks re-embedded (through id {last_id})")
+                if self.throttle:
+                    time.sleep(self.throttle)
+        self.create_indexes()
+        return copied
+
+    def create_indexes(self):
+        """Recreate the live table's secondary indexes (ANN, full-text, metadata) on the shadow table."""
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.relname, pg_get_indexdef(i.indexrelid)
+                    FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE i.indrelid = to_regclass(%s) AND NOT i.indisprimary AND i.indisvalid
+                """, (LIVE_TABLE,))
+                definitions = cur.fetchall()
+            conn.commit()
+            dim = int(embedding.get_backend().dim)
+            conn.dbapi_connection.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SET maintenance_work_mem = '512MB'")
+                    for name, definition in definitions:
+                        # Quantized ANN indexes cast to the old width, e.g. ::halfvec(384)
+                        definition = re.sub(r"::(vector|halfvec|bit)\(\d+\)", rf"::\1({dim})", definition)
+                        # The shadow is not live yet, so a plain (faster) build is fine
+                        shadow_name = derived_index_name(name, "_shadow")
+                        definition = definition.replace(
+                            f"INDEX {name} ON", f"INDEX IF NOT EXISTS {shadow_name} ON", 1
+                        )
+                        definition = re.sub(rf" ON (\S+\.)?{LIVE_TABLE} USING", f" ON {SHADOW_TABLE} USING",
+                                            definition, count=1)
+                        print(f"🔧 Building {shadow_name}")
+                        cur.execute(definition)
+                    cur.execute(f"ANALYZE {SHADOW_TABLE}")
+            finally:
+                with conn.cursor() as cur:
+                    cur.execute("RESET maintenance_work_mem")
+                conn.dbapi_connection.autocommit = False
+
+    def _catch_up(self, conn) -> int:
+        """Sync the shadow table with writes made to the live table since it was copied."""
+        with conn.cursor() as cur:
+            # Rows removed from the live table, or whose text changed (re-embedded below)
+            cur.execute(f"""
+                DELETE FROM {SHADOW_TABLE} s
+                WHERE NOT EXISTS (SELECT 1 FROM {LIVE_TABLE} l WHERE l.id = s.id AND l.text = s.text)
+            """)
+            # Metadata-only updates need no new embedding
+            cur.execute(f"""
+                UPDATE {SHADOW_TABLE} s
+                SET source = l.source, country = l.country, document_type = l.document_type,
+                    source_type = l.source_type, document_id = l.document_id, chunk_key = l.chunk_key,
+                    chunk_number = l.chunk_number, owner_user_id = l.owner_user_id
+                FROM {LIVE_TABLE} l
+                WHERE l.id = s.id
+                  AND (l.source, l.country, l.document_type, l.source_type, l.document_id, l.chunk_key, l.chunk_number,
+                       l.owner_user_id)
+                      IS DISTINCT FROM (s.source, s.country, s.document_type, s.source_type, s.document_id, s.chunk_key,
+                                        s.chunk_number, s.owner_user_id)
+            """)
+            cur.execute(f"""
+                {_SELECT} FROM {LIVE_TABLE} l
+                WHERE NOT EXISTS (SELECT 1 FROM {SHADOW_TABLE} s WHERE s.id = l.id)
+                ORDER BY l.id
+            """)
+            rows = cur.fetchall()
+        return self._copy_rows(conn, rows) if rows else 0
+
+    def _migrate_document_chunks(self, cur, dim):
+        """Give document_chunks the shadow table's vectors (and width), so later upload mirrors stay consistent.
+
+        Runs inside the swap transaction. Every mirrored upload chunk already
+        has its new vector in the shadow table (chunk_key is the
+        document_chunks id); any chunk without a mirror is embedded here.
+        """
+        cur.execute("ALTER TABLE document_chunks ALTER COLUMN embedding DROP NOT NULL")
+        cur.execute(f"ALTER TABLE document_chunks ALTER COLUMN embedding TYPE vector({dim}) USING NULL")
+        cur.execute(f"""
+            UPDATE document_chunks d SET embedding = s.embedding
+            FROM {SHADOW_TABLE} s
+            WHERE s.chunk_key = d.id
+        """)
+        cur.execute("SELECT id, content FROM document_chunks WHERE embedding IS NULL")
+        rows = cur.fetchall()
+        if rows:
+            vectors = self._embed([row[1] for row in rows])
+            cur.executemany(
+                "UPDATE document_chunks SET embedding = %s WHERE id = %s",
+                [(vector, row[0]) for row, vector in zip(rows, vectors)],
+            )
+        cur.execute("ALTER TABLE document_chunks ALTER COLUMN embedding SET NOT NULL")
+        print(f"🔄 Moved document_chunks to vector({dim}) ({len(rows)} chunks re-embedded)")
+
+    @staticmethod
+    def _record_model(cur, dim):
+        """Store the model the new table was built with; see utils.vector_db.apply_embedding_model."""
+        backend, model_name = embedding.active_model()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_model (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                backend TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                dim INTEGER NOT NULL
+            )
+        """)
+        cur.execute("""
+            INSERT INTO embedding_model (id, backend, model_name, dim) VALUES (1, %s, %s, %s)
+            ON CONFLICT (id) DO UPDATE SET
+                backend = EXCLUDED.backend, model_name = EXCLUDED.model_name, dim = EXCLUDED.dim
+        """, (backend, model_name, dim))
+
+    def swap(self, drop_previous=False, lock_timeout="5s"):
+        """Atomically replace legal_chunks with the shadow table.
+
+        Readers keep being served until the final rename; writers wait for
+        the last catch-up. The old table is kept as legal_chunks_previous
+        unless ``drop_previous``. document_chunks and the recorded embedding
+        model are switched in the same transaction.
+        """
+        with get_connection() as conn:
+            # Shrink the gap with writes still allowed
+            while True:
+                synced = self._catch_up(conn)
+                conn.commit()
+                print(f"🔄 Caught up {synced} changed chunks")
+                if synced < SWAP_CATCH_UP_ROWS:
+                    break
+
+            dim = int(embedding.get_backend().dim)
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+                # Blocks writes but not reads while the last changes are copied.
+                # Uploads write document_chunks first, so lock it first too.
+                cur.execute("SELECT to_regclass('document_chunks') IS NOT NULL")
+                has_uploads = cur.fetchone()[0]
+                if has_uploads:
+                    cur.execute("LOCK TABLE document_chunks IN SHARE ROW EXCLUSIVE MODE")
+                cur.execute(f"LOCK TABLE {LIVE_TABLE} IN SHARE ROW EXCLUSIVE MODE")
+                self._catch_up(conn)
+                if has_uploads:
+                    self._migrate_document_chunks(cur, dim)
+
+                cur.execute(f"DROP TABLE IF EXISTS {PREVIOUS_TABLE}")
+                live_names = {}
+                for name in _index_names(cur, LIVE_TABLE):
+                    live_names[derived_index_name(name, "_shadow")] = name
+                    cur.execute(f"ALTER INDEX {name} RENAME TO {derived_index_name(name, '_previous')}")
+                for name in _index_names(cur, SHADOW_TABLE):
+                    # Shadow names may be hashed, so map them back through the live names
+                    new_name = live_names.get(name)
+                    if new_name is None and name.endswith("_shadow"):
+                        new_name = name[:-len("_shadow")]
+                    if new_name is not None:
+                        cur.execute(f"ALTER INDEX {name} RENAME TO {new_name}")
+                cur.execute(f"ALTER TABLE {LIVE_TABLE} RENAME CONSTRAINT {LIVE_TABLE}_pkey TO {PREVIOUS_TABLE}_pkey")
+                cur.execute(f"ALTER TABLE {LIVE_TABLE} RENAME TO {PREVIOUS_TABLE}")
+                cur.execute(f"ALTER TABLE {SHADOW_TABLE} RENAME CONSTRAINT {SHADOW_TABLE}_pkey TO {LIVE_TABLE}_pkey")
+                cur.execute(f"ALTER TABLE {SHADOW_TABLE} RENAME TO {LIVE_TABLE}")
+                cur.execute(f"COMMENT ON TABLE {LIVE_TABLE} IS NULL")
+                # Keep the id sequence alive if the previous table is dropped later
+                cur.execute(f"ALTER SEQUENCE {LIVE_TABLE}_id_seq OWNED BY {LIVE_TABLE}.id")
+                if drop_previous:
+                    cur.execute(f"DROP TABLE {PREVIOUS_TABLE}")
+                self._record_model(cur, dim)
+            conn.commit()
+        # Cached results came from the old embeddings; ids and texts are unchanged
+        bump_corpus_version(document_ids=())
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed legal_chunks into a shadow table and swap it in")
+    parser.add_argument("command", choices=["build", "swap", "run"])
+    parser.add_argument("--backend", default=None, help="embedding backend (default: EMBEDDING_BACKEND)")
+    parser.add_argument("--model", default=None, help="sentence-transformers model name")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--throttle-ms", type=int, default=0, help="pause between batches")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--restart", action="store_true", help="discard an existing shadow table")
+    parser.add_argument("--drop-previous", action="store_true", help="drop the old table after the swap")
+    args = parser.parse_args()
+
+    reindexer = Reindexer(
+        args.batch_size, args.throttle_ms, args.workers, args.backend,
+        **({"model_name": args.model} if args.model else {}),
+    )
+    try:
+        if args.command in ("build", "run"):
+            count = reindexer.build(restart=args.restart)
+            print(f"✅ Shadow table ready: {count} chunks re-embedded")
+        if args.command in ("swap", "run"):
+            reindexer.swap(drop_previous=args.drop_previous)
+            print(f"✅ {SHADOW_TABLE} is now {LIVE_TABLE}")
+    finally:
+        reindexer.close()
@@ -0,0 +1,138 @@
+# utils/reranker.py
+
+import os
+import threading
+import time
+
+import numpy as np
+
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_ENABLED = os.getenv("SEARCH_RERANK", "").lower() in ("1", "true", "yes")
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "40"))
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BATCH_SIZE = 16
+MAX_SEQ_LENGTH = 256
+# After this many skips in a row, the top min(k, n) candidates are reranked
+# anyway so the cost estimate can recover from a slow spell
+RERANK_PROBE_EVERY = int(os.getenv("RERANK_PROBE_EVERY", "10"))
+
+# Warm-up pairs as long as real ones: a short question against a chunk that
+# fills MAX_SEQ_LENGTH tokens
+_WARM_UP_QUERY = "Can the police search my phone without a warrant?"
+_WARM_UP_PASSAGE = " ".join([
+    "Subject to the provisions of this Constitution, every person shall be entitled to his personal liberty "
+    "and no person shall be deprived of such liberty save in the following cases and in accordance with a "
+    "procedure permitted by law."
+] * 8)
+
+
+class CrossEncoderReranker:
+    """Rescores (query, chunk) pairs with a small local cross-encoder.
+
+    Reranking is best effort under ``budget_ms``: the per-pair cost is
+    tracked as a moving average, and only as many candidates as are
+    predicted to fit are rescored. If fewer than ``k`` would fit, the
+    first-stage order is returned untouched, except that every
+    ``probe_every``-th skip in a row reranks the top k to re-measure the cost.
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL, budget_ms: float = RERANK_BUDGET_MS,
+                 batch_size: int = RERANK_BATCH_SIZE, probe_every: int = RERANK_PROBE_EVERY):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=MAX_SEQ_LENGTH)
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.probe_every = probe_every
+        self.ms_per_pair = None
+        self.reranked = 0
+        self.skipped = 0
+        self._skips_in_row = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        """Run two batches: the first pays for lazy init, the second seeds the cost estimate."""
+        pairs = [(_WARM_UP_QUERY, _WARM_UP_PASSAGE)] * self.batch_size
+        self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        self.ms_per_pair = None
+        self._time(pairs)
+
+    def _time(self, pairs):
+        start = time.perf_counter()
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        per_pair = (time.perf_counter() - start) * 1000 / len(pairs)
+        with self._lock:
+            self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * per_pair
+        return np.asarray(scores, dtype=np.float32)
+
+    def affordable(self, n: int) -> int:
+        """How many of ``n`` candidates fit in the time budget."""
+        if self.ms_per_pair is None:
+            return n
+        return min(n, int(self.budget_ms / self.ms_per_pair))
+
+    def rerank(self, query: str, candidates: list, k: int, text_index: int = 1) -> list:
+        """Return the top k of ``candidates`` rows, best first.
+
+        ``text_index`` is the position of the chunk text in each row.
+        """
+        if not candidates:
+            return []
+        n = self.affordable(len(candidates))
+        if n < min(k, len(candidates)) or n == 0:
+            with self._lock:
+                self._skips_in_row += 1
+                probe = self.probe_every > 0 and self._skips_in_row >= self.probe_every
+                if probe:
+                    self._skips_in_row = 0
+                else:
+                    self.skipped += 1
+            if not probe:
+                return list(candidates[:k])
+            # The estimate only moves when pairs are timed
+            n = min(k, len(candidates))
+        else:
+            with self._lock:
+                self._skips_in_row = 0
+        head = candidates[:n]
+        scores = self._time([(query, row[text_index]) for row in head])
+        order = np.argsort(-scores, kind="stable")
+        with self._lock:
+            self.reranked += 1
+        return [head[i] for i in order[:k]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "reranked": self.reranked,
+                "skipped": self.skipped,
+                "ms_per_pair": self.ms_per_pair,
+                "budget_ms": self.budget_ms,
+            }
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+_reranker_kwargs = {}
+_enabled = RERANK_ENABLED
+
+
+def configure_reranker(enabled: bool = True, **kwargs):
+    """Turn reranking on or off by default and set model_name / budget_ms / batch_size / probe_every."""
+    global _reranker, _reranker_kwargs, _enabled
+    with _reranker_lock:
+        _enabled = enabled
+        _reranker_kwargs = kwargs
+        _reranker = None
+
+
+def rerank_enabled() -> bool:
+    return _enabled
+
+
+def get_reranker() -> CrossEncoderReranker:
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker(**_reranker_kwargs)
+    return _reranker
@@ -0,0 +1,274 @@
+# utils/retrieval_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.embedding_cache import QueryEmbeddingCache
+
+RETRIEVAL_CACHE_URL = os.getenv("RETRIEVAL_CACHE_URL", "")
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "4096"))
+RETRIEVAL_CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", "86400"))
+# How long a worker trusts its last read of the corpus version
+CORPUS_VERSION_TTL = float(os.getenv("CORPUS_VERSION_TTL", "5"))
+# Bumps remembered in corpus_changes; a worker further behind clears its chunk cache
+CORPUS_CHANGES_KEPT = 1000
+
+
+class MemoryStore:
+    """Per-process LRU store; the default for single-worker deployments."""
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisStore:
+    """Shared store so every worker benefits from each other's retrievals."""
+
+    def __init__(self, url: str, ttl: int = RETRIEVAL_CACHE_TTL, prefix: str = "retrieval:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        # JSON, not pickle: anyone who can write to a shared Redis must not be
+        # able to run code in the API. Rows are plain tuples of scalars.
+        return [tuple(row) for row in json.loads(data)] if data is not None else None
+
+    def set(self, key, value):
+        # Old corpus versions are never read again; the TTL lets Redis reclaim them
+        self.client.set(self.prefix + key, json.dumps([list(row) for row in value]), ex=self.ttl)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+class RetrievalCache:
+    """Caches top-k results keyed by (normalized query, k, filters, corpus version).
+
+    Entries are never explicitly invalidated: ingestion bumps the corpus
+    version, which changes every key, so stale results simply stop matching.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._version_read_at = 0.0
+        self._lock = threading.Lock()
+
+    def corpus_version(self):
+        """The current corpus version, or None if it has never been readable."""
+        now = time.monotonic()
+        if self._version is None or now - self._version_read_at > CORPUS_VERSION_TTL:
+            version = read_corpus_version()
+            with self._lock:
+                # On a failed read keep the last known version rather than
+                # falling back to one whose entries may be stale
+                if version is not None:
+                    self._version = version
+                self._version_read_at = now
+        return self._version
+
+    def make_key(self, query, **params):
+        """Cache key, or None (don't cache) while the corpus version is unknown."""
+        version = self.corpus_version()
+        if version is None:
+            return None
+        payload = json.dumps(
+            {
+                "query": QueryEmbeddingCache.normalize(query),
+                "version": version,
+                **params,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if key is None:
+            return None
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            # A shared store outage must not take retrieval down with it
+            print(f"Retrieval cache read failed: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if key is None:
+            return
+        try:
+            self.store.set(key, value)
+        except Exception as e:
+            print(f"Retrieval cache write failed: {e}")
+
+    def note_version(self, version: int):
+        with self._lock:
+            self._version, self._version_read_at = version, time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "corpus_version": self._version,
+            }
+
+
+def read_corpus_version():
+    """Current corpus version from Postgres (0 before the first bump, None when unreadable).
+
+    Also picks up the embedding model a reindex swap recorded, so serving
+    processes switch models along with the version bump that follows it.
+    """
+    from utils.vector_db import VECTOR_BACKEND, apply_embedding_model, get_connection, read_embedding_model
+    if VECTOR_BACKEND == "faiss":
+        # The local store only changes when it is rebuilt
+        from utils.faiss_store import get_store
+        return get_store().version
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                model = read_embedding_model(cur)
+                # No table yet just means nothing has been bumped
+                cur.execute("SELECT to_regclass('corpus_version') IS NOT NULL")
+                if cur.fetchone()[0]:
+                    cur.execute("SELECT version FROM corpus_version WHERE id = 1")
+                    row = cur.fetchone()
+                else:
+                    row = None
+            conn.rollback()
+        apply_embedding_model(model)
+        return row[0] if row else 0
+    except Exception as e:
+        print(f"Corpus version read failed: {e}")
+        return None
+
+
+def read_corpus_changes(since: int, until: int):
+    """Ids of chunks whose text may have changed in place between two corpus versions.
+
+    None when that is unknown: a bump in the range did not say which
+    documents it touched, or its record has already been pruned.
+    """
+    from utils.vector_db import VECTOR_BACKEND, get_connection
+    if VECTOR_BACKEND == "faiss" or until <= since:
+        return None
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('corpus_changes') IS NOT NULL")
+                if not cur.fetchone()[0]:
+                    return None
+                cur.execute("""
+                    SELECT count(*), bool_or(document_ids IS NULL)
+                    FROM corpus_changes WHERE version > %s AND version <= %s
+                """, (since, until))
+                recorded, unknown = cur.fetchone()
+                if recorded != until - since or unknown:
+                    return None
+                cur.execute("""
+                    SELECT id FROM legal_chunks WHERE document_id IN (
+                        SELECT unnest(document_ids) FROM corpus_changes WHERE version > %s AND version <= %s
+                    )
+                """, (since, until))
+                ids = {row[0] for row in cur.fetchall()}
+            conn.rollback()
+        return ids
+    except Exception as e:
+        print(f"Corpus changes read failed: {e}")
+        return None
+
+
+def bump_corpus_version(document_ids=None) -> int:
+    """Increment the corpus version after chunks are added, changed or removed.
+
+    ``document_ids`` are the documents whose chunks changed in place, so
+    chunk caches only drop those; pass () when chunks were only added or
+    re-embedded. None (the default) means anything may have changed.
+    """
+    from utils.vector_db import get_connection
+    if document_ids is not None:
+        document_ids = [str(document_id) for document_id in document_ids]
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # Single-row counter; part of every retrieval cache key
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS corpus_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version BIGINT NOT NULL
+                )
+            """)
+            # One row per bump, read by ChunkCache in every worker
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS corpus_changes (
+                    version BIGINT PRIMARY KEY,
+                    document_ids UUID[]
+                )
+            """)
+            cur.execute("""
+                INSERT INTO corpus_version (id, version) VALUES (1, 1)
+                ON CONFLICT (id) DO UPDATE SET version = corpus_version.version + 1
+                RETURNING version
+            """)
+            version = cur.fetchone()[0]
+            cur.execute(
+                "INSERT INTO corpus_changes (version, document_ids) VALUES (%s, %s::uuid[])",
+                (version, document_ids),
+            )
+            cur.execute("DELETE FROM corpus_changes WHERE version <= %s", (version - CORPUS_CHANGES_KEPT,))
+        conn.commit()
+    retrieval_cache.note_version(version)
+    return version
+
+
+def make_store(url: str = RETRIEVAL_CACHE_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    return MemoryStore()
+
+
+def configure_retrieval_cache(url: str = RETRIEVAL_CACHE_URL) -> RetrievalCache:
+    """Point the shared cache at a store, e.g. Redis from backend.core.config.Settings."""
+    retrieval_cache.store = make_store(url)
+    return retrieval_cache
+
+
+retrieval_cache = RetrievalCache(make_store())
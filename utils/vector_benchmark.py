@@ -0,0 +1,138 @@
+# utils/vector_benchmark.py
+# Recall / latency / index size comparison of the ANN quantization modes.
+#
+#   python -m utils.vector_benchmark --modes none halfvec binary --build-indexes \
+#       --queries 200 --output bench_vectors.json
+#
+# Queries are the benchmark questions plus the opening words of randomly
+# sampled stored chunks. Ground truth is an exact sequential scan over the
+# full-precision column; every mode runs its own copy of the search statement
+# (see utils.vector_db.build_statements), so VECTOR_QUANTIZATION need not be set.
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+from utils.embedding import get_embeddings
+from utils.embedding_benchmark import QUESTIONS, percentiles
+from utils.vector_db import (
+    QUANTIZATIONS,
+    RESCORE_FACTOR,
+    VECTOR_DISTANCE,
+    ann_index_name,
+    build_statements,
+    create_ann_index,
+    get_connection,
+    search_settings,
+    to_vector,
+)
+
+_NO_FILTERS = (None, None, None)
+
+
+def sample_queries(n: int, seed: int = 0) -> list[str]:
+    """Benchmark questions topped up with chunk openings from legal_chunks."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT setseed(%s)", (seed / 2 ** 31,))
+            cur.execute("""
+                SELECT array_to_string((regexp_split_to_array(text, '\\s+'))[1:12], ' ')
+                FROM legal_chunks ORDER BY random() LIMIT %s
+            """, (max(0, n - len(QUESTIONS)),))
+            openings = [row[0] for row in cur.fetchall()]
+        conn.rollback()
+    queries = QUESTIONS[:n] + openings
+    random.Random(seed).shuffle(queries)
+    return queries
+
+
+def _run_mode(quantization, vectors, k, recall):
+    """Top-k ids and per-query latency for one quantization mode."""
+    name = f"bench_search_{quantization}"
+    types, body = build_statements(quantization)["legal_chunks_search"]
+    hits, latencies = [], []
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"PREPARE {name} {types} AS {body}")
+            conn.commit()
+            try:
+                for vector in vectors:
+                    for setting, value in search_settings(recall, _NO_FILTERS, k, quantization).items():
+                        cur.execute(f"SET LOCAL {setting} = %s", (value,))
+                    t0 = time.perf_counter()
+                    # No owner: the shared corpus only, as for anonymous searches
+                    cur.execute(f"EXECUTE {name} (%s, %s, %s, %s, %s, %s)", (vector, k, *_NO_FILTERS, None))
+                    rows = cur.fetchall()
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    conn.rollback()
+                    hits.append([row[0] for row in rows])
+            finally:
+                conn.rollback()
+                cur.execute(f"DEALLOCATE {name}")
+                conn.commit()
+    return hits, latencies
+
+
+def _index_size_mb(name):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_relation_size(to_regclass(%s))", (name,))
+            size = cur.fetchone()[0]
+        conn.rollback()
+    return None if size is None else size / (1024 * 1024)
+
+
+def run_benchmark(modes, queries=200, k=5, recall="balanced", method="hnsw", build_indexes=False,
+                  rebuild=False) -> dict:
+    texts = sample_queries(queries)
+    vectors = [to_vector(v) for v in get_embeddings(texts)]
+    truth, _ = _run_mode("none", vectors, k, "exact")
+
+    results = []
+    for quantization in modes:
+        entry = {"quantization": quantization, "index": ann_index_name(method, quantization=quantization)}
+        if build_indexes:
+            t0 = time.perf_counter()
+            create_ann_index(method, VECTOR_DISTANCE, rebuild=rebuild, quantization=quantization)
+            entry["index_build_s"] = time.perf_counter() - t0
+        entry["index_size_mb"] = _index_size_mb(entry["index"])
+        hits, latencies = _run_mode(quantization, vectors, k, recall)
+        found = sum(len(set(h) & set(t)) for h, t in zip(hits, truth))
+        expected = sum(len(t) for t in truth)
+        entry[f"recall@{k}"] = found / expected if expected else None
+        entry["latency"] = percentiles(latencies)
+        results.append(entry)
+        print(f"⏱️  {quantization}: recall@{k} {entry[f'recall@{k}']:.3f}, "
+              f"p50 {entry['latency']['p50_ms']:.1f} ms, index {entry['index_size_mb'] or 0:.1f} MB")
+
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "queries": len(texts),
+        "k": k,
+        "recall_profile": recall,
+        "method": method,
+        "distance": VECTOR_DISTANCE,
+        "rescore_factor": RESCORE_FACTOR,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full-precision, halfvec and binary ANN search")
+    parser.add_argument("--modes", nargs="+", choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--recall", choices=["fast", "balanced"], default="balanced")
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--build-indexes", action="store_true", help="create each mode's index and time it")
+    parser.add_argument("--rebuild", action="store_true", help="with --build-indexes, drop existing indexes first")
+    parser.add_argument("--output", default="bench_vectors.json")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.modes, args.queries, args.k, args.recall, args.method, args.build_indexes,
+                           args.rebuild)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
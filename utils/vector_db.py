@@ -1,47 +1,1094 @@
 # vector_db.py
 
-from sqlalchemy import text
-from config.database import SessionLocal
-from utils.embedding import get_embedding
+import argparse
+import os
+import re
+from contextlib import contextmanager
 
+import numpy as np
+from psycopg2 import errors
+from pgvector.psycopg2 import register_vector
 
-def search_similar_chunks(query, k=5):
-    embedding = get_embedding(query)
+from utils.chunk_cache import chunk_cache, ids_only_enabled, merge_rows, without_text
+from utils.chunk_writer import DEFAULT_COPY_BATCH_SIZE, copy_legal_chunks
+from utils.embedding import cache_namespace, get_embedding, get_embeddings, get_query_embedding, use_model
+from utils.mmr import mmr_select
+from utils.passages import merge_passages
+from utils.reranker import RERANK_CANDIDATES, RERANKER_MODEL, get_reranker, rerank_enabled
+from utils.retrieval_cache import retrieval_cache
 
-    # Convert list to SQL vector string format: '[0.1, 0.2, ...]'
-    embedding_str = f"'[{','.join([str(x) for x in embedding])}]'"
+# Must match the embedding model; change it together with a reindex (utils.reindex)
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))
 
-    sql = text(f"""
-        SELECT id, text, source
+# Distance metric -> (operator class for the ANN index, SQL operator). MiniLM
+# vectors are unit-normalized, so l2 and cosine give the same ranking.
+DISTANCES = {
+    "l2": ("vector_l2_ops", "<->"),
+    "cosine": ("vector_cosine_ops", "<=>"),
+    "ip": ("vector_ip_ops", "<#>"),
+}
+VECTOR_DISTANCE = os.getenv("VECTOR_DISTANCE", "l2")
+DISTANCE_OP = DISTANCES[VECTOR_DISTANCE][1]
+
+# Per-query ANN search breadth. "exact" turns index scans off for the
+# statement so Postgres falls back to an exact sequential scan.
+RECALL_PROFILES = {
+    "fast": {"hnsw.ef_search": 20, "ivfflat.probes": 1},
+    "balanced": {"hnsw.ef_search": 64, "ivfflat.probes": 10},
+    "exact": {"enable_indexscan": "off"},
+}
+DEFAULT_RECALL = os.getenv("VECTOR_RECALL", "balanced")
+# pgvector >= 0.8 can keep scanning the HNSW graph until enough rows pass a
+# metadata filter instead of returning fewer than k. Older versions reject
+# the setting, so "auto" checks the installed extension version once;
+# "true" / "false" skip the check.
+ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "auto").lower()
+ITERATIVE_SCAN_MIN_VERSION = (0, 8)
+
+DEFAULT_COUNTRY = "nigeria"
+DEFAULT_DOCUMENT_TYPE = "legal_document"
+
+# legal_chunks.source_type: statutes ingested by utils.data_ingest are
+# "corpus"; chunks mirrored from backend uploads (document_chunks) are "upload".
+SOURCE_TYPE_CORPUS = "corpus"
+SOURCE_TYPE_UPLOAD = "upload"
+
+# "pgvector" queries Postgres; "faiss" searches the local memory-mapped copy
+# built by `python -m utils.vector_db build-local` and needs no database.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pgvector")
+
+# Reciprocal rank fusion constant (score = sum of 1 / (RRF_K + rank)) and the
+# language used for the legal_chunks.tsv full-text column.
+RRF_K = 60
+TEXT_SEARCH_CONFIG = "english"
+
+# MMR trade-off between relevance (1.0) and diversity (0.0), and how many
+# candidates per returned chunk are fetched for it to choose from.
+MMR_LAMBDA = float(os.getenv("SEARCH_MMR_LAMBDA", "0.5"))
+MMR_FETCH_FACTOR = 4
+
+# Default adaptive-k cutoffs, in the configured distance metric; unset keeps
+# every hit. A hit is dropped when its distance exceeds MAX_DISTANCE or
+# exceeds the best hit's by more than MAX_DISTANCE_GAP (relative).
+MAX_DISTANCE = float(os.environ["SEARCH_MAX_DISTANCE"]) if os.getenv("SEARCH_MAX_DISTANCE") else None
+MAX_DISTANCE_GAP = float(os.environ["SEARCH_MAX_DISTANCE_GAP"]) if os.getenv("SEARCH_MAX_DISTANCE_GAP") else None
+
+# Small-to-big: chunks on either side of each hit merged into its passage (0 = off)
+NEIGHBORS = int(os.getenv("SEARCH_NEIGHBORS", "0"))
+
+# Metadata filter shared by the search statements. A NULL parameter means
+# "no filter"; with custom plans the planner folds the NULL checks away, so
+# a country filter can use a partial ANN index built for that country.
+# Uploads are private: rows with an owner only match that owner's searches,
+# and a NULL owner parameter searches the shared corpus alone.
+_METADATA_FILTER = """
+    ($3::varchar IS NULL OR country = $3)
+    AND ($4::varchar IS NULL OR document_type = $4)
+    AND ($5::varchar IS NULL OR source = $5)
+    AND (owner_user_id IS NULL OR owner_user_id = {OWNER})
+"""
+
+# ANN-stage vector storage. "halfvec" and "binary" search an expression
+# index over a half-precision or 1-bit copy of each embedding (see
+# create_ann_index(quantization=...)), fetch RESCORE_FACTOR times more
+# candidates, and rescore them against the full-precision column. Even
+# recall="exact" only rescores that shortlist. `python -m
+# utils.vector_benchmark` compares the modes on the live table.
+QUANTIZATIONS = ("none", "halfvec", "binary")
+QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+
+def ann_order(quantization=QUANTIZATION, column="embedding", query="$1"):
+    """ORDER BY expression that matches the ANN index for ``quantization``."""
+    if quantization == "halfvec":
+        return f"{column}::halfvec({EMBEDDING_DIM}) {DISTANCE_OP} {query}::halfvec({EMBEDDING_DIM})"
+    if quantization == "binary":
+        return f"binary_quantize({column})::bit({EMBEDDING_DIM}) <~> binary_quantize({query})"
+    if quantization == "none":
+        return f"{column} {DISTANCE_OP} {query}"
+    raise ValueError(f"Unknown quantization '{quantization}'. Choose from: {', '.join(QUANTIZATIONS)}")
+
+
+def _candidates(limit, quantization):
+    # Quantized distances only shortlist; the exact ORDER BY picks the final rows
+    return limit if quantization == "none" else f"{limit} * {RESCORE_FACTOR}"
+
+
+# $1 query vector, $2 k, $3 country, $4 document type, $5 source, $6 owner
+_SEARCH_SQL = """
+    SELECT {COLUMNS}
+    FROM (
+        SELECT id, text, source, embedding, embedding {DISTANCE_OP} $1 AS distance
         FROM legal_chunks
-        ORDER BY embedding <-> {embedding_str}::vector
-        LIMIT :k
+        WHERE {FILTER}
+        ORDER BY {ANN_ORDER}
+        LIMIT {CANDIDATES}
+    ) hits
+    ORDER BY distance
+    LIMIT $2
+"""
+
+# Lexical and vector candidates in one round trip, fused with RRF.
+# $1 query vector, $2 final k, $3-$5 filters as above,
+# $6 query text, $7 candidates per side, $8 RRF k, $9 owner
+_HYBRID_SQL = """
+    WITH vector_hits AS (
+        SELECT id, row_number() OVER (ORDER BY distance) AS rank
+        FROM (
+            SELECT id, embedding {DISTANCE_OP} $1 AS distance
+            FROM legal_chunks
+            WHERE {FILTER}
+            ORDER BY {ANN_ORDER}
+            LIMIT {CANDIDATES}
+        ) v
+        ORDER BY distance
+        LIMIT $7
+    ),
+    lexical_hits AS (
+        SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+        FROM (
+            SELECT id, ts_rank_cd(tsv, query) AS score
+            FROM legal_chunks, websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', $6) AS query
+            WHERE tsv @@ query AND {FILTER}
+            ORDER BY score DESC
+            LIMIT $7
+        ) l
+    ),
+    fused AS (
+        SELECT id, sum(1.0 / ($8 + rank)) AS score
+        FROM (SELECT * FROM vector_hits UNION ALL SELECT * FROM lexical_hits) hits
+        GROUP BY id
+    )
+    SELECT {COLUMNS}
+    FROM fused
+    JOIN legal_chunks c USING (id)
+    ORDER BY fused.score DESC
+    LIMIT $2
+"""
+
+# Top-k for many query vectors in one statement: one LATERAL ANN scan per
+# element of $1 (vector literals sent as text[]). $2 k, $3-$5 filters, $6 owner.
+_SEARCH_BATCH_SQL = """
+    SELECT q.query_no, hits.id, hits.text, hits.source, hits.distance
+    FROM unnest($1::vector[]) WITH ORDINALITY AS q(embedding, query_no)
+    CROSS JOIN LATERAL (
+        SELECT id, text, source, distance
+        FROM (
+            SELECT id, text, source, legal_chunks.embedding {DISTANCE_OP} q.embedding AS distance
+            FROM legal_chunks
+            WHERE {FILTER}
+            ORDER BY {ANN_ORDER}
+            LIMIT {CANDIDATES}
+        ) candidates
+        ORDER BY distance
+        LIMIT $2
+    ) hits
+    ORDER BY q.query_no, hits.distance
+"""
+
+# Chunks within $2 positions of each hit $1 in the same document, through
+# legal_chunks_source_chunk_number_idx; $3 owner, as in _METADATA_FILTER
+_NEIGHBORS_SQL = """
+    SELECT hit.id, hit.document_id::text, c.chunk_number, c.text
+    FROM legal_chunks hit
+    JOIN legal_chunks c
+      ON c.source = hit.source
+     AND c.document_id IS NOT DISTINCT FROM hit.document_id
+     AND c.chunk_number BETWEEN hit.chunk_number - $2 AND hit.chunk_number + $2
+     AND (c.owner_user_id IS NULL OR c.owner_user_id = $3)
+    WHERE hit.id = ANY($1)
+      AND (hit.owner_user_id IS NULL OR hit.owner_user_id = $3)
+    ORDER BY hit.id, c.chunk_number
+"""
+
+# Named server-side prepared statements: (parameter types, body). Each pooled
+# connection prepares a statement the first time it runs it, so Postgres
+# parses and plans it once per connection instead of once per query.
+_SEARCH_PARAMS = "(vector, integer, varchar, varchar, varchar, varchar)"
+_HYBRID_PARAMS = "(vector, integer, varchar, varchar, varchar, text, integer, integer, varchar)"
+
+
+def statement_name(base, ids_only=False, with_embeddings=False):
+    """Name of the ``base`` ("legal_chunks_search" / "legal_chunks_hybrid") variant to run."""
+    return base + ("_ids" if ids_only else "") + ("_embeddings" if with_embeddings else "")
+
+
+def build_statements(quantization=QUANTIZATION):
+    """The search and insert statements, with the ANN stage for ``quantization``."""
+    common = dict(DISTANCE_OP=DISTANCE_OP, ANN_ORDER=ann_order(quantization))
+    hybrid = dict(common, TEXT_SEARCH_CONFIG=TEXT_SEARCH_CONFIG, CANDIDATES=_candidates("$7", quantization),
+                  FILTER=_METADATA_FILTER.format(OWNER="$9"))
+    search = dict(common, CANDIDATES=_candidates("$2", quantization), FILTER=_METADATA_FILTER.format(OWNER="$6"))
+    hybrid_distance = f"c.embedding {DISTANCE_OP} $1 AS distance"
+    statements = {}
+    # "_ids" variants leave text and source out; callers fill them in from
+    # utils.chunk_cache. "_embeddings" variants append each candidate's
+    # vector, for MMR re-selection.
+    for ids_only in (False, True):
+        search_columns = "id, distance" if ids_only else "id, text, source, distance"
+        hybrid_columns = f"c.id, {hybrid_distance}" if ids_only else f"c.id, c.text, c.source, {hybrid_distance}"
+        for with_embeddings in (False, True):
+            if with_embeddings:
+                search_columns, hybrid_columns = f"{search_columns}, embedding", f"{hybrid_columns}, c.embedding"
+            statements[statement_name("legal_chunks_search", ids_only, with_embeddings)] = (
+                _SEARCH_PARAMS, _SEARCH_SQL.format(COLUMNS=search_columns, **search))
+            statements[statement_name("legal_chunks_hybrid", ids_only, with_embeddings)] = (
+                _HYBRID_PARAMS, _HYBRID_SQL.format(COLUMNS=hybrid_columns, **hybrid))
+    return {
+        **statements,
+        "legal_chunks_search_batch": ("(text[], integer, varchar, varchar, varchar, varchar)", _SEARCH_BATCH_SQL.format(
+            DISTANCE_OP=DISTANCE_OP, FILTER=_METADATA_FILTER.format(OWNER="$6"),
+            ANN_ORDER=ann_order(quantization, "legal_chunks.embedding", "q.embedding"),
+            CANDIDATES=_candidates("$2", quantization),
+        )),
+        "legal_chunks_fetch": ("(integer[])", "SELECT id, text, source FROM legal_chunks WHERE id = ANY($1)"),
+        "legal_chunks_neighbors": ("(integer[], integer, varchar)", _NEIGHBORS_SQL),
+        # source_type is explicit: ORM-created tables may lack its DEFAULT
+        "legal_chunks_insert": ("(text, text, vector, varchar, varchar)", f"""
+            INSERT INTO legal_chunks (text, source, embedding, country, document_type, source_type)
+            VALUES ($1, $2, $3, $4, $5, '{SOURCE_TYPE_CORPUS}')
+            RETURNING id
+        """),
+    }
+
+
+STATEMENTS = build_statements()
+
+
+def set_embedding_dim(dim: int):
+    """Serve ``dim``-dimensional vectors: to_vector's check and the quantized casts in STATEMENTS."""
+    global EMBEDDING_DIM
+    if int(dim) == EMBEDDING_DIM:
+        return
+    EMBEDDING_DIM = int(dim)
+    # Updated in place, since utils.async_vector_db imports the dict; changed
+    # bodies are re-prepared by execute_prepared (asyncpg keys its cache by SQL)
+    STATEMENTS.update(build_statements())
+
+
+def read_embedding_model(cur):
+    """(backend, model_name, dim) a reindex swap recorded in embedding_model, or None."""
+    cur.execute("SELECT to_regclass('embedding_model') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return None
+    cur.execute("SELECT backend, model_name, dim FROM embedding_model WHERE id = 1")
+    return cur.fetchone()
+
+
+def apply_embedding_model(model):
+    """Embed and search with a model from read_embedding_model (None keeps the configured one).
+
+    Applied by create_tables on startup and by
+    utils.retrieval_cache.read_corpus_version each time it polls.
+    """
+    if model is None:
+        return
+    backend, model_name, dim = model
+    use_model(backend, model_name)
+    set_embedding_dim(dim)
+
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled psycopg2 connection with the pgvector adapter registered."""
+    # Imported here so the local vector backend works without DATABASE_URL
+    from config.database import engine
+    conn = engine.raw_connection()
+    try:
+        if not conn.info.get("pgvector_registered"):
+            register_vector(conn.dbapi_connection)
+            conn.info["pgvector_registered"] = True
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def get_autocommit_connection():
+    """Borrow a pooled connection in autocommit mode, e.g. for CREATE INDEX CONCURRENTLY.
+
+    Session settings made on it (such as maintenance_work_mem) are reset
+    before it goes back to the pool.
+    """
+    with get_connection() as conn:
+        # register_vector may have opened a transaction, and psycopg2 refuses
+        # to switch to autocommit inside one
+        conn.rollback()
+        conn.dbapi_connection.autocommit = True
+        try:
+            yield conn
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("RESET ALL")
+            conn.dbapi_connection.autocommit = False
+
+
+def execute_prepared(conn, name, params, fetch=True, settings=None):
+    """Run a named statement from STATEMENTS, preparing it on this connection if needed.
+
+    ``settings`` are applied with SET LOCAL first, so they only last for the
+    current transaction (the pool rolls back when the connection is returned).
+    """
+    # name -> body prepared on this connection; a body changes after set_embedding_dim
+    prepared = conn.info.setdefault("prepared_statements", {})
+    placeholders = ", ".join(["%s"] * len(params))
+    for attempt in range(2):
+        cur = conn.cursor()
+        try:
+            for setting, value in (settings or {}).items():
+                cur.execute(f"SET LOCAL {setting} = %s", (value,))
+            types, body = STATEMENTS[name]
+            if prepared.get(name) != body:
+                if name in prepared:
+                    cur.execute(f"DEALLOCATE {name}")
+                    del prepared[name]
+                cur.execute(f"PREPARE {name} {types} AS {body}")
+                prepared[name] = body
+            cur.execute(f"EXECUTE {name} ({placeholders})", params)
+            return cur.fetchall() if fetch else None
+        except (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement,
+                errors.FeatureNotSupported) as e:
+            # Our bookkeeping and the server disagree (e.g. after DISCARD ALL
+            # or a rolled-back PREPARE), or a reindex swap changed the
+            # embedding type ("cached plan must not change result type");
+            # resync and try once more.
+            conn.rollback()
+            if not isinstance(e, errors.InvalidSqlStatementName):
+                cur.execute(f"DEALLOCATE {name}")
+            prepared.pop(name, None)
+            if attempt:
+                raise
+        finally:
+            cur.close()
+
+
+def to_vector(embedding) -> np.ndarray:
+    """Coerce a list or array into the 1-D float32 array the pgvector adapter binds."""
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    if vector.shape[0] != EMBEDDING_DIM:
+        raise ValueError(f"expected {EMBEDDING_DIM} dimensions, not {vector.shape[0]}")
+    return vector
+
+
+# What create_tables() sets up on legal_chunks beyond the original columns
+_MIGRATED_COLUMNS = ("country", "document_type", "source_type", "document_id", "chunk_key", "chunk_number",
+                     "owner_user_id", "tsv")
+_MIGRATED_INDEXES = ("legal_chunks_tsv_idx", "legal_chunks_chunk_key_idx", "legal_chunks_document_id_idx",
+                     "legal_chunks_source_chunk_number_idx", "legal_chunks_country_type_idx")
+
+
+def schema_is_current(cur) -> bool:
+    """True when legal_chunks and document_chunks need nothing from create_tables().
+
+    Reads only the catalogs, so it takes no locks on the tables themselves.
+    """
+    cur.execute("""
+        SELECT count(*) FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'legal_chunks' AND column_name = ANY(%s)
+    """, (list(_MIGRATED_COLUMNS),))
+    if cur.fetchone()[0] != len(_MIGRATED_COLUMNS):
+        return False
+    cur.execute("""
+        SELECT count(*) FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = 'legal_chunks' AND indexname = ANY(%s)
+    """, (list(_MIGRATED_INDEXES),))
+    if cur.fetchone()[0] != len(_MIGRATED_INDEXES):
+        return False
+    cur.execute("""
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = to_regclass('document_chunks') AND attname = 'embedding'
     """)
+    row = cur.fetchone()
+    return row is None or row[0] == f"vector({EMBEDDING_DIM})"
+
+
+def create_tables():
+    """Create the pgvector extension and the legal_chunks table if missing.
+
+    legal_chunks is the single retrieval index: ingested statutes and
+    backend uploads (mirrored from document_chunks) live side by side,
+    told apart by source_type.
+
+    Every API worker calls this on startup, so an up-to-date schema is
+    detected from the catalogs first: the ALTERs and CREATE INDEX below take
+    table locks even when they change nothing, and would queue chat reads
+    behind a concurrent index build or reindex swap.
+
+    The embedding model and dimension recorded by a reindex swap are loaded
+    first, so the tables are checked against the width actually stored.
+    """
+    from config.database import engine
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            apply_embedding_model(read_embedding_model(cur))
+            if schema_is_current(cur):
+                conn.rollback()
+                return
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS legal_chunks (
+                    id SERIAL PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    source VARCHAR,
+                    embedding vector({EMBEDDING_DIM}),
+                    country VARCHAR(50) NOT NULL DEFAULT '{DEFAULT_COUNTRY}',
+                    document_type VARCHAR(100) NOT NULL DEFAULT '{DEFAULT_DOCUMENT_TYPE}',
+                    source_type VARCHAR(20) NOT NULL DEFAULT '{SOURCE_TYPE_CORPUS}',
+                    document_id UUID,
+                    chunk_key VARCHAR(255),
+                    chunk_number INTEGER,
+                    owner_user_id VARCHAR(255),
+                    tsv tsvector GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', text)) STORED
+                )
+            """)
+            # Tables created before metadata filtering existed
+            cur.execute(f"""
+                ALTER TABLE legal_chunks
+                ADD COLUMN IF NOT EXISTS country VARCHAR(50) NOT NULL DEFAULT '{DEFAULT_COUNTRY}',
+                ADD COLUMN IF NOT EXISTS document_type VARCHAR(100) NOT NULL DEFAULT '{DEFAULT_DOCUMENT_TYPE}',
+                ADD COLUMN IF NOT EXISTS source_type VARCHAR(20) NOT NULL DEFAULT '{SOURCE_TYPE_CORPUS}',
+                ADD COLUMN IF NOT EXISTS document_id UUID,
+                ADD COLUMN IF NOT EXISTS chunk_key VARCHAR(255),
+                ADD COLUMN IF NOT EXISTS chunk_number INTEGER,
+                ADD COLUMN IF NOT EXISTS owner_user_id VARCHAR(255)
+            """)
+            # Uploads mirrored before owners were recorded would otherwise be
+            # visible to everyone; take the owner from their document
+            cur.execute(f"""
+                DO $$
+                BEGIN
+                    IF to_regclass('legal_documents') IS NOT NULL THEN
+                        UPDATE legal_chunks l SET owner_user_id = d.user_id
+                        FROM legal_documents d
+                        WHERE l.document_id = d.id
+                          AND l.source_type = '{SOURCE_TYPE_UPLOAD}'
+                          AND l.owner_user_id IS NULL;
+                    END IF;
+                END $$
+            """)
+            # Tables created by the ORM (init_db.py / create_all_tables.py) or
+            # before hybrid search existed; mode="hybrid" needs both
+            cur.execute(f"""
+                ALTER TABLE legal_chunks
+                ADD COLUMN IF NOT EXISTS tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', text)) STORED
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS legal_chunks_tsv_idx ON legal_chunks USING gin (tsv)")
+            # chunk_key is the document_chunks id of an upload's chunk (NULL for corpus rows)
+            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS legal_chunks_chunk_key_idx ON legal_chunks (chunk_key)")
+            cur.execute("CREATE INDEX IF NOT EXISTS legal_chunks_document_id_idx ON legal_chunks (document_id)")
+            # Neighbor lookups for small-to-big expansion (see expand_neighbors)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS legal_chunks_source_chunk_number_idx
+                ON legal_chunks (source, chunk_number)
+            """)
+            # document_chunks was declared vector(1536), which the 384-d model
+            # could never fill; align it so uploads can be mirrored here
+            cur.execute(f"""
+                DO $$
+                BEGIN
+                    IF (SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                        WHERE attrelid = to_regclass('document_chunks') AND attname = 'embedding')
+                        <> 'vector({EMBEDDING_DIM})' THEN
+                        ALTER TABLE document_chunks ALTER COLUMN embedding TYPE vector({EMBEDDING_DIM});
+                    END IF;
+                END $$
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS legal_chunks_country_type_idx ON legal_chunks (country, document_type)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def create_fulltext_index():
+    """Add the generated tsv column and its GIN index to an existing legal_chunks."""
+    with get_autocommit_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                ALTER TABLE legal_chunks
+                ADD COLUMN IF NOT EXISTS tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', text)) STORED
+            """)
+            cur.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS legal_chunks_tsv_idx ON legal_chunks USING gin (tsv)")
+
+
+def ann_index_name(method, country=None, quantization="none"):
+    suffix = "" if quantization == "none" else f"_{quantization}"
+    if country:
+        return f"legal_chunks_embedding_{method}{suffix}_{re.sub(r'[^a-z0-9]+', '_', country.lower())}_idx"
+    return f"legal_chunks_embedding_{method}{suffix}_idx"
+
+
+def _ann_index_target(distance, quantization):
+    """(indexed expression, operator class) for an ANN index."""
+    if quantization == "halfvec":
+        return f"(embedding::halfvec({EMBEDDING_DIM}))", f"halfvec_{DISTANCES[distance][0][len('vector_'):]}"
+    if quantization == "binary":
+        return f"(binary_quantize(embedding)::bit({EMBEDDING_DIM}))", "bit_hamming_ops"
+    return "embedding", DISTANCES[distance][0]
+
+
+def create_ann_index(method="hnsw", distance=VECTOR_DISTANCE, m=16, ef_construction=64, lists=None,
+                     rebuild=False, maintenance_work_mem="512MB", country=None, quantization=QUANTIZATION):
+    """Create (or rebuild) the HNSW or IVFFlat index on legal_chunks.embedding.
+
+    Built CONCURRENTLY so chat keeps searching while it runs. For IVFFlat,
+    ``lists`` defaults to rows / 1000 (sqrt(rows) beyond a million rows),
+    which is why it should be built after the corpus is loaded.
+
+    With ``country`` the index is partial (``WHERE country = ...``): queries
+    filtered to that country scan only its slice of the corpus.
+
+    With ``quantization`` "halfvec" or "binary" the index is built over a
+    half-precision or binary-quantized expression of the column instead;
+    the table keeps full-precision vectors for rescoring. Searches use it
+    when VECTOR_QUANTIZATION is set to the same value.
+    """
+    if method not in ("hnsw", "ivfflat"):
+        raise ValueError(f"Unknown ANN index method '{method}'. Choose 'hnsw' or 'ivfflat'.")
+    ann_order(quantization)  # validates the name
+    target, opclass = _ann_index_target(distance, quantization)
+    name = ann_index_name(method, country, quantization)
+
+    with get_autocommit_connection() as conn:
+        with conn.cursor() as cur:
+            if method == "hnsw":
+                options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+            else:
+                if lists is None:
+                    if country:
+                        cur.execute("SELECT count(*) FROM legal_chunks WHERE country = %s", (country,))
+                    else:
+                        cur.execute("SELECT count(*) FROM legal_chunks")
+                    rows = cur.fetchone()[0]
+                    lists = rows // 1000 if rows <= 1_000_000 else int(rows ** 0.5)
+                options = f"lists = {max(1, int(lists))}"
+
+            cur.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+            if rebuild:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            where = cur.mogrify(" WHERE country = %s", (country,)).decode() if country else ""
+            cur.execute(f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+                ON legal_chunks USING {method} ({target} {opclass})
+                WITH ({options}){where}
+            """)
+    return name
+
+
+def drop_ann_index(method="hnsw", country=None, quantization="none"):
+    with get_autocommit_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {ann_index_name(method, country, quantization)}")
 
-    with SessionLocal() as db:
-        results = db.execute(sql, {"k": k}).fetchall()
 
+_iterative_scan = None
+
+
+def note_pgvector_version(version):
+    """Record the server's pgvector extversion (None if not installed) for iterative_scan_enabled."""
+    global _iterative_scan
+    if ITERATIVE_SCAN == "auto":
+        parts = tuple(int(part) for part in re.findall(r"\d+", version or ""))
+        _iterative_scan = bool(parts) and parts >= ITERATIVE_SCAN_MIN_VERSION
+
+
+def iterative_scan_enabled() -> bool:
+    """Whether filtered searches may SET hnsw.iterative_scan (see VECTOR_ITERATIVE_SCAN)."""
+    if ITERATIVE_SCAN != "auto":
+        return ITERATIVE_SCAN in ("1", "true", "yes")
+    if VECTOR_BACKEND == "faiss":
+        return False
+    if _iterative_scan is None:
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                    row = cur.fetchone()
+                conn.rollback()
+        except Exception as e:
+            # Not cached: the next search tries again
+            print(f"pgvector version check failed: {e}")
+            return False
+        note_pgvector_version(row[0] if row else None)
+    return _iterative_scan
+
+
+def search_settings(recall, filters, limit=None, quantization=QUANTIZATION):
+    """SET LOCAL values for one search whose ANN stage must return ``limit`` rows.
+
+    An HNSW scan returns at most hnsw.ef_search rows, so it is raised to the
+    number of ANN candidates the statement asks for (``limit``, times
+    RESCORE_FACTOR when quantized).
+    """
+    if recall not in RECALL_PROFILES:
+        raise ValueError(f"Unknown recall '{recall}'. Choose from: {', '.join(RECALL_PROFILES)}")
+    settings = dict(RECALL_PROFILES[recall])
+    if limit and "hnsw.ef_search" in settings:
+        candidates = int(limit) * (RESCORE_FACTOR if quantization != "none" else 1)
+        settings["hnsw.ef_search"] = max(settings["hnsw.ef_search"], candidates)
+    if any(value is not None for value in filters):
+        # Plan with the actual filter values so partial per-country indexes match
+        settings["plan_cache_mode"] = "force_custom_plan"
+        if recall != "exact" and iterative_scan_enabled():
+            settings["hnsw.iterative_scan"] = "relaxed_order"
+    return settings
+
+
+def retrieval_key(query, k, recall, mode, filters, diversify, fetch_k, mmr_lambda, rerank,
+                  max_distance, max_gap, min_k, neighbors=0):
+    params = dict(filters, max_distance=max_distance, max_gap=max_gap, min_k=min_k)
+    if neighbors:
+        params.update(neighbors=neighbors)
+    if diversify:
+        params.update(fetch_k=fetch_k, mmr_lambda=mmr_lambda)
+    if rerank:
+        params.update(rerank=RERANKER_MODEL)
+    return retrieval_cache.make_key(
+        query, k=k, recall=recall, mode=mode, backend=VECTOR_BACKEND, model=cache_namespace(), **params
+    )
+
+
+def apply_cutoffs(rows, max_distance=None, max_gap=None, min_k=1, max_k=None):
+    """Drop weak hits from (id, text, source, distance) rows, keeping their order.
+
+    A row survives if its distance is within ``max_distance`` and within
+    ``max_gap`` (relative) of the best distance among ``rows``. The first
+    ``min_k`` rows are always kept, and at most ``max_k`` are returned.
+    """
+    rows = list(rows)
+    if not rows:
+        return rows
+    best = min(r[3] for r in rows)
+    limit = float("inf") if max_distance is None else max_distance
+    if max_gap is not None:
+        # abs() keeps the gap meaningful for negative inner-product distances
+        limit = min(limit, best + max_gap * max(abs(best), 1e-6))
+    kept = [r for i, r in enumerate(rows) if i < min_k or r[3] <= limit]
+    return kept[:max_k] if max_k is not None else kept
+
+
+def _rerank(query, candidates, k):
+    try:
+        return get_reranker().rerank(query, candidates, k)
+    except Exception as e:
+        # The reranker is an optional precision boost; keep first-stage order
+        print(f"⚠️ Reranking failed, using first-stage order: {e}")
+        return list(candidates[:k])
+
+
+def expand_passages(rows, neighbors=1, owner_user_id=None):
+    """Small-to-big: widen each (id, text, source, distance) hit to ``neighbors`` chunks either side.
+
+    One indexed query fetches every window; contiguous windows in the same
+    document are merged into one passage (see utils.passages.merge_passages).
+    Only chunks ``owner_user_id`` may see are used, as in the search itself.
+    """
+    rows = list(rows)
+    if not rows or neighbors <= 0:
+        return rows
+    ids = [int(row[0]) for row in rows]
+    if VECTOR_BACKEND == "faiss":
+        from utils.faiss_store import get_store
+        windows = get_store().neighbors(ids, neighbors, owner_user_id)
+    else:
+        with get_connection() as conn:
+            windows = execute_prepared(conn, "legal_chunks_neighbors", (ids, neighbors, owner_user_id))
+    return merge_passages(rows, windows)
+
+
+def backfill_chunk_numbers() -> int:
+    """Number legal_chunks rows written before chunk_number existed. Returns the rows updated.
+
+    Uploads take document_chunks.chunk_number. Corpus rows are numbered in
+    id order per source, which is the order utils.data_ingest inserted them
+    in; sources that already have numbers are left alone.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            updated = 0
+            cur.execute("SELECT to_regclass('document_chunks') IS NOT NULL")
+            if cur.fetchone()[0]:
+                cur.execute("""
+                    UPDATE legal_chunks l
+                    SET chunk_number = d.chunk_number
+                    FROM document_chunks d
+                    WHERE l.chunk_key = d.id AND l.chunk_number IS NULL
+                """)
+                updated += cur.rowcount
+            cur.execute(f"""
+                UPDATE legal_chunks l
+                SET chunk_number = n.chunk_number
+                FROM (
+                    SELECT id, row_number() OVER (PARTITION BY source ORDER BY id) AS chunk_number
+                    FROM legal_chunks
+                    WHERE source_type = '{SOURCE_TYPE_CORPUS}' AND source IN (
+                        SELECT source FROM legal_chunks
+                        WHERE source_type = '{SOURCE_TYPE_CORPUS}'
+                        GROUP BY source
+                        HAVING bool_and(chunk_number IS NULL)
+                    )
+                ) n
+                WHERE l.id = n.id
+            """)
+            updated += cur.rowcount
+        conn.commit()
+    return updated
+
+
+def candidate_pool_size(k, diversify=False, fetch_k=None, rerank=False):
+    """How many first-stage hits the MMR / rerank stages need to pick k from."""
+    if diversify:
+        return max(fetch_k or MMR_FETCH_FACTOR * k, k)
+    if rerank:
+        return max(RERANK_CANDIDATES, k)
+    return k
+
+
+def select_results(query, embedding, candidates, k, diversify=False, mmr_lambda=MMR_LAMBDA, rerank=False,
+                   max_distance=None, max_gap=None, min_k=1, mode="vector"):
+    """Turn first-stage candidates into the final rows: MMR, rerank, then cutoffs.
+
+    Distance cutoffs only apply to ``mode="vector"``: hybrid rows are in
+    fused order, and a lexical match (e.g. "Section 35") can be a good hit
+    with a large vector distance.
+    """
+    if mode == "hybrid":
+        max_distance = max_gap = None
+    results = candidates
+    if diversify and results:
+        # Hybrid candidates arrive in fused order; keep it as the relevance term
+        picks = mmr_select(embedding, [r[4] for r in results], 2 * k if rerank else k, mmr_lambda,
+                           ranked=mode == "hybrid")
+        results = [tuple(results[i][:4]) for i in picks]
+    if rerank and results:
+        results = _rerank(query, results, k)
+    return apply_cutoffs(results, max_distance, max_gap, min_k, max_k=k)
+
+
+def search_steps(query, embedding, candidates, k, diversify, mmr_lambda, rerank, max_distance, max_gap, min_k, mode,
+                 ids_only, neighbors, owner_user_id=None):
+    """Everything after the first-stage query, shared by the sync and async search.
+
+    A generator, so each caller runs the I/O its own way: it yields
+    ``(step, args)`` for "hydrate", "select", "record" and "expand", expects
+    that step's result to be sent back, and returns the final rows. See
+    run_search_steps and async_vector_db.run_search_steps_async.
+    """
+    results = candidates
+    if ids_only:
+        # Only the reranker and the final rows need text
+        results = (yield "hydrate", (results,)) if rerank else without_text(results)
+    results = yield "select", (query, embedding, results, k, diversify, mmr_lambda, rerank, max_distance, max_gap,
+                               min_k, mode)
+    if ids_only:
+        if not rerank:
+            results = yield "hydrate", ([(row[0], row[3]) for row in results],)
+        yield "record", (results,)
+    if neighbors:
+        results = yield "expand", (results, neighbors, owner_user_id)
+    return results
+
+
+def run_search_steps(steps):
+    """Drive search_steps with the blocking helpers of this module."""
+    handlers = {
+        "hydrate": hydrate_rows,
+        "select": select_results,
+        "record": record_traffic,
+        "expand": expand_passages,
+    }
+    result = None
+    while True:
+        try:
+            step, args = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result = handlers[step](*args)
+
+
+def search_similar_chunks(query, k=5, embedding=None, recall=DEFAULT_RECALL, mode="vector",
+                          country=None, document_type=None, source=None, use_cache=True,
+                          diversify=False, fetch_k=None, mmr_lambda=MMR_LAMBDA, rerank=None,
+                          max_distance=MAX_DISTANCE, max_gap=MAX_DISTANCE_GAP, min_k=1, ids_only=None,
+                          neighbors=NEIGHBORS, owner_user_id=None):
+    """Return up to k (id, text, source, distance) rows for query, best first.
+
+    ``recall`` trades speed for accuracy per query: "fast", "balanced" or "exact".
+    ``mode="hybrid"`` also matches the query's words against the full-text
+    index and fuses both rankings, so exact names like "Section 35" or
+    "Land Use Act" are not lost to pure embedding similarity.
+    ``country``, ``document_type`` and ``source`` restrict the search to
+    matching chunks inside the index scan.
+    ``diversify=True`` fetches ``fetch_k`` candidates (default 4 * k) and
+    re-selects k of them with maximal marginal relevance, so overlapping
+    chunks of one passage do not crowd out other relevant passages.
+    ``rerank=True`` (default: utils.reranker.rerank_enabled()) rescores the candidates with
+    the cross-encoder in utils.reranker, within its latency budget. With
+    ``diversify`` too, MMR first keeps 2 * k distinct candidates to rerank.
+    ``max_distance``, ``max_gap`` and ``min_k`` make k adaptive in vector
+    mode; see apply_cutoffs. ``distance`` is in the VECTOR_DISTANCE metric.
+    Results are cached per corpus version unless ``use_cache`` is False.
+    ``ids_only=True`` (default: utils.chunk_cache.ids_only_enabled()) has the
+    ANN query return only ids and distances and fills text from the
+    in-process chunk cache, so popular chunks are not re-sent every time.
+    ``neighbors`` > 0 is small-to-big retrieval: the small chunks are
+    matched, then each is returned with ``neighbors`` adjacent chunks on
+    either side, and hits from one contiguous stretch of a document come
+    back as a single passage (so fewer than k rows is possible).
+    ``owner_user_id`` adds that user's private uploads to the shared corpus;
+    without it only the corpus is searched.
+    """
+    if mode not in ("vector", "hybrid"):
+        raise ValueError(f"Unknown search mode '{mode}'. Choose 'vector' or 'hybrid'.")
+    rerank = rerank_enabled() if rerank is None else rerank
+    # The local store is in-process; text costs nothing to return
+    ids_only = (ids_only_enabled() if ids_only is None else ids_only) and VECTOR_BACKEND != "faiss"
+    filters = dict(country=country, document_type=document_type, source=source, owner_user_id=owner_user_id)
+    key = None
+    if use_cache:
+        key = retrieval_key(
+            query, k, recall, mode, filters, diversify, fetch_k, mmr_lambda, rerank, max_distance, max_gap, min_k,
+            neighbors,
+        )
+        cached = retrieval_cache.get(key)
+        if cached is not None:
+            if ids_only:
+                record_traffic(cached)
+            return cached
+
+    # Callers that already embedded the query (e.g. via utils.embedding_queue) pass it in
+    if embedding is None:
+        embedding = get_query_embedding(query)
+    pool_k = candidate_pool_size(k, diversify, fetch_k, rerank)
+    if mode == "hybrid":
+        results = query_hybrid_chunks(query, embedding, k=pool_k, recall=recall, with_embeddings=diversify,
+                                      ids_only=ids_only, **filters)
+    else:
+        results = query_similar_chunks(embedding, k=pool_k, recall=recall, with_embeddings=diversify,
+                                       ids_only=ids_only, **filters)
+    results = run_search_steps(search_steps(
+        query, embedding, results, k, diversify, mmr_lambda, rerank, max_distance, max_gap, min_k, mode, ids_only,
+        neighbors, owner_user_id,
+    ))
+
+    if key is not None:
+        retrieval_cache.set(key, [tuple(r) for r in results])
+    return results
+
+
+def search_similar_chunks_batch(queries, k=5, embeddings=None, recall=DEFAULT_RECALL,
+                                country=None, document_type=None, source=None, owner_user_id=None):
+    """Top-k (id, text, source, distance) rows for each query, in one forward pass and one round trip.
+
+    Returns a list with one result list per query, in input order.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+    if embeddings is None:
+        embeddings = get_embeddings(queries)
+    filters = (country, document_type, source)
+    settings = search_settings(recall, filters, k)
+
+    if VECTOR_BACKEND == "faiss":
+        from utils.faiss_store import get_store
+        store = get_store()
+        return [
+            store.search(vector, k=k, recall=recall, country=country, document_type=document_type, source=source,
+                         owner_user_id=owner_user_id)
+            for vector in embeddings
+        ]
+
+    with get_connection() as conn:
+        rows = execute_prepared(
+            conn,
+            "legal_chunks_search_batch",
+            ([to_vector(vector) for vector in embeddings], k, *filters, owner_user_id),
+            settings=settings,
+        )
+    results = [[] for _ in queries]
+    for query_no, *row in rows:
+        # WITH ORDINALITY numbers from 1
+        results[query_no - 1].append(tuple(row))
     return results
 
 
-def add_chunk(chunk, source, embedding=None):
-    from utils.embedding import get_embedding
+def add_chunk(chunk, source, embedding=None, country=DEFAULT_COUNTRY, document_type=DEFAULT_DOCUMENT_TYPE):
     # If embedding is not provided, generate it
     if embedding is None:
         embedding = get_embedding(chunk)
-    # Ensure embedding is a list, not numpy array
-    if hasattr(embedding, "tolist"):
-        embedding = embedding.tolist()
-    # ...existing code to insert chunk and embedding into DB...
-
-
-def query_similar_chunks(embedding, k=5):
-    # Ensure embedding is a list, not numpy array
-    if hasattr(embedding, "tolist"):
-        embedding = embedding.tolist()
-    sql = "SELECT id, text, source FROM legal_chunks ORDER BY embedding <-> %(embedding)s LIMIT %(k)s"
-    params = {'embedding': embedding, 'k': k}
-    # ...existing code to execute query...
+    with get_connection() as conn:
+        rows = execute_prepared(
+            conn, "legal_chunks_insert", (chunk, source, to_vector(embedding), country, document_type)
+        )
+        conn.commit()
+    return rows[0][0]
+
+
+def add_chunks(chunks, source, embeddings, batch_size=DEFAULT_COPY_BATCH_SIZE,
+               country=DEFAULT_COUNTRY, document_type=DEFAULT_DOCUMENT_TYPE):
+    """Bulk-load one document's chunks with binary COPY in a single transaction."""
+    with get_connection() as conn:
+        try:
+            count = copy_legal_chunks(
+                conn,
+                (
+                    (chunk, source, vector, country, document_type, number)
+                    for number, (chunk, vector) in enumerate(zip(chunks, embeddings), start=1)
+                ),
+                batch_size,
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return count
+
+
+def upsert_document_chunks(conn, document_id, source, owner_user_id, document_type=DEFAULT_DOCUMENT_TYPE) -> int:
+    """Mirror one uploaded document's document_chunks rows into legal_chunks.
+
+    The rows are owned by ``owner_user_id`` and only returned to that user's
+    searches. Copies server-side (INSERT ... SELECT), so vectors are not sent twice.
+    Runs on the caller's connection without committing, so an upload and its
+    index entries land in one transaction. Re-running updates in place.
+    Returns the row count.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO legal_chunks
+                (text, source, embedding, country, document_type, source_type, document_id, chunk_key, chunk_number,
+                 owner_user_id)
+            SELECT content, %s, embedding, country, %s, '{SOURCE_TYPE_UPLOAD}', document_id, id, chunk_number, %s
+            FROM document_chunks
+            WHERE document_id = %s
+            ON CONFLICT (chunk_key) DO UPDATE SET
+                text = EXCLUDED.text,
+                source = EXCLUDED.source,
+                embedding = EXCLUDED.embedding,
+                country = EXCLUDED.country,
+                document_type = EXCLUDED.document_type,
+                chunk_number = EXCLUDED.chunk_number,
+                owner_user_id = EXCLUDED.owner_user_id
+        """, (source, document_type, str(owner_user_id), str(document_id)))
+        return cur.rowcount
+
+
+def delete_document_chunks(conn, document_id) -> int:
+    """Remove an uploaded document's entries from legal_chunks (no commit)."""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM legal_chunks WHERE document_id = %s", (str(document_id),))
+        return cur.rowcount
+
+
+def fetch_chunks(ids):
+    """(id, text, source) rows for chunk ids, in no particular order; unknown ids are skipped."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+    with get_connection() as conn:
+        return execute_prepared(conn, "legal_chunks_fetch", (ids,))
+
+
+def hydrate_rows(rows):
+    """Fill text and source into (id, distance, ...) rows from the chunk cache, fetching misses."""
+    found, missing = chunk_cache.get_many([row[0] for row in rows])
+    if missing:
+        fetched = fetch_chunks(missing)
+        chunk_cache.put_many(fetched)
+        found.update((chunk_id, (text, source)) for chunk_id, text, source in fetched)
+    return merge_rows(rows, found)
+
+
+def record_traffic(results):
+    """Count the returned chunk ids towards the chunk cache's startup warm-up."""
+    if chunk_cache.record([row[0] for row in results]):
+        chunk_cache.flush_traffic()
+
+
+def query_similar_chunks(embedding, k=5, recall=DEFAULT_RECALL, country=None, document_type=None, source=None,
+                         with_embeddings=False, ids_only=False, owner_user_id=None):
+    """Nearest (id, text, source, distance) rows, with each row's embedding appended if ``with_embeddings``.
+
+    ``ids_only`` leaves out text and source: rows are (id, distance[, embedding]).
+    Uploads are only searched for their ``owner_user_id``.
+    """
+    filters = (country, document_type, source)
+    settings = search_settings(recall, filters, k)
+    if VECTOR_BACKEND == "faiss":
+        from utils.faiss_store import get_store
+        rows = get_store().search(embedding, k=k, recall=recall, country=country, document_type=document_type,
+                                  source=source, with_embeddings=with_embeddings, owner_user_id=owner_user_id)
+        return [(row[0], *row[3:]) for row in rows] if ids_only else rows
+    statement = statement_name("legal_chunks_search", ids_only, with_embeddings)
+    with get_connection() as conn:
+        return execute_prepared(
+            conn, statement, (to_vector(embedding), k, *filters, owner_user_id), settings=settings
+        )
+
+
+def query_hybrid_chunks(query, embedding, k=5, recall=DEFAULT_RECALL, candidates=None,
+                        country=None, document_type=None, source=None, with_embeddings=False, ids_only=False,
+                        owner_user_id=None):
+    """Fuse full-text and vector rankings with reciprocal rank fusion."""
+    filters = (country, document_type, source)
+    if VECTOR_BACKEND == "faiss":
+        # The local store has no lexical index; fall back to vector search
+        return query_similar_chunks(embedding, k=k, recall=recall, country=country, document_type=document_type,
+                                    source=source, with_embeddings=with_embeddings, ids_only=ids_only,
+                                    owner_user_id=owner_user_id)
+    candidates = candidates or max(4 * k, 20)
+    settings = search_settings(recall, filters, candidates)
+    statement = statement_name("legal_chunks_hybrid", ids_only, with_embeddings)
+    with get_connection() as conn:
+        return execute_prepared(
+            conn,
+            statement,
+            (to_vector(embedding), k, *filters, str(query), candidates, RRF_K, owner_user_id),
+            settings=settings,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the legal_chunks vector store")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_cmd = commands.add_parser("index", help="create or rebuild the ANN index")
+    index_cmd.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    index_cmd.add_argument("--distance", choices=list(DISTANCES), default=VECTOR_DISTANCE)
+    index_cmd.add_argument("--m", type=int, default=16)
+    index_cmd.add_argument("--ef-construction", type=int, default=64)
+    index_cmd.add_argument("--lists", type=int, default=None)
+    index_cmd.add_argument("--rebuild", action="store_true")
+    index_cmd.add_argument("--country", default=None, help="build a partial index for one country")
+    index_cmd.add_argument("--quantization", choices=QUANTIZATIONS, default=QUANTIZATION,
+                           help="index a halfvec or binary-quantized copy of the embeddings")
+
+    commands.add_parser("fulltext", help="add the tsv column and GIN index for hybrid search")
+    commands.add_parser("chunk-numbers", help="number chunks stored before chunk_number existed")
+
+    local_cmd = commands.add_parser("build-local", help="rebuild the local FAISS/memmap store from legal_chunks")
+    local_cmd.add_argument("--path", default=None)
+    args = parser.parse_args()
+
+    if args.command == "index":
+        name = create_ann_index(args.method, args.distance, args.m, args.ef_construction, args.lists, args.rebuild,
+                                country=args.country, quantization=args.quantization)
+        print(f"✅ Index ready: {name}")
+    elif args.command == "fulltext":
+        create_fulltext_index()
+        print("✅ Full-text index ready: legal_chunks_tsv_idx")
+    elif args.command == "chunk-numbers":
+        create_tables()
+        print(f"✅ Numbered {backfill_chunk_numbers()} chunks")
+    elif args.command == "build-local":
+        from utils import faiss_store
+        count = faiss_store.rebuild(args.path or faiss_store.DEFAULT_STORE_PATH)
+        print(f"✅ Local vector store rebuilt with {count} chunks")
+
 
 
 